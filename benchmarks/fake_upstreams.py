@@ -0,0 +1,174 @@
+"""In-process stand-ins for the Ecwid REST API, Zoho Inventory and Zoho OAuth.
+
+UpstreamTransport routes requests by host to small FastAPI apps, so the real
+pooled clients can be pointed at them with open_http_pools(transport=...).
+"""
+import asyncio
+import itertools
+import random
+
+from typing import Dict, Optional
+
+import httpx
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+
+class FaultProfile:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+
+    async def apply(self) -> Optional[Response]:
+        """Sleep for the configured latency and maybe return an injected error response."""
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return JSONResponse({"errorMessage": "Too many requests"}, status_code=429, headers={"Retry-After": str(self.retry_after)})
+        if roll < self.rate_limit_rate + self.error_rate:
+            return JSONResponse({"errorMessage": "Injected failure"}, status_code=500)
+        return None
+
+
+def _with_faults(app: FastAPI, faults: FaultProfile) -> None:
+    @app.middleware("http")
+    async def inject_faults(request: Request, call_next):
+        app.state.request_count += 1
+        injected = await faults.apply()
+        if injected is not None:
+            return injected
+        return await call_next(request)
+
+    app.state.request_count = 0
+
+
+def build_ecwid_app(faults: FaultProfile, products_per_order: int = 3, product_ids: int = 1000) -> FastAPI:
+    app = FastAPI()
+    _with_faults(app, faults)
+
+    @app.get("/api/v3/{store_id}/orders/{order_id}")
+    async def get_order(store_id: int, order_id: str) -> dict:
+        return {
+            "id": order_id,
+            "email": f"customer{random.randint(1, 500)}@example.com",
+            "items": [
+                {"productId": random.randint(1, product_ids), "price": 9.99, "quantity": random.randint(1, 3)}
+                for _ in range(products_per_order)
+            ],
+            "shippingPerson": {"name": "Bench Customer", "firstName": "Bench", "lastName": "Customer"},
+            "billingPerson": {"name": "Bench Customer"},
+        }
+
+    @app.put("/api/v3/{store_id}/products/{product_id}/inventory")
+    async def adjust_product_stock(store_id: int, product_id: int) -> dict:
+        return {"updateCount": 1}
+
+    batches: Dict[str, list] = {}
+
+    @app.post("/api/v3/{store_id}/batch")
+    async def submit_batch(store_id: int, request: Request) -> dict:
+        ticket = f"{random.getrandbits(64):x}"
+        batches[ticket] = await request.json()
+        return {"ticket": ticket}
+
+    @app.get("/api/v3/{store_id}/batch")
+    async def get_batch(store_id: int, ticket: str) -> dict:
+        requests = batches.pop(ticket, [])
+        return {
+            "status": "COMPLETED",
+            "totalRequests": len(requests),
+            "completedRequests": len(requests),
+            "requests": [
+                {"id": sub["id"], "status": "COMPLETED", "httpStatusCode": 200, "escapedHttpBody": '{"updateCount":1}'}
+                for sub in requests
+            ],
+        }
+
+    return app
+
+
+def build_zoho_app(faults: FaultProfile) -> FastAPI:
+    app = FastAPI()
+    _with_faults(app, faults)
+    ids = itertools.count(1)
+
+    @app.get("/inventory/v1/contacts")
+    async def list_contacts(email: Optional[str] = None) -> dict:
+        if random.random() < 0.5:
+            return {"contacts": []}
+        return {"contacts": [{"contact_id": str(next(ids)), "email": email}]}
+
+    @app.post("/inventory/v1/contacts")
+    async def create_contact() -> dict:
+        return {"contact": {"contact_id": str(next(ids))}}
+
+    @app.post("/inventory/v1/salesorders")
+    async def create_sales_order() -> dict:
+        return {"salesorder": {"salesorder_id": str(next(ids))}}
+
+    @app.post("/inventory/v1/salesorders/{sales_order_id}/status/confirmed")
+    async def confirm_sales_order(sales_order_id: str) -> dict:
+        return {"message": "Sales order confirmed"}
+
+    @app.delete("/inventory/v1/salesorders/{sales_order_id}")
+    async def delete_sales_order(sales_order_id: str) -> dict:
+        return {"message": "Sales order deleted"}
+
+    return app
+
+
+def build_zoho_accounts_app(faults: FaultProfile) -> FastAPI:
+    app = FastAPI()
+    _with_faults(app, faults)
+
+    @app.post("/oauth/v2/token")
+    async def refresh_token() -> dict:
+        return {"access_token": f"bench-{random.getrandbits(64):x}", "expires_in": 3600}
+
+    return app
+
+
+class UpstreamTransport(httpx.AsyncBaseTransport):
+    def __init__(self, apps: Dict[str, FastAPI]):
+        """`apps` maps a host suffix (e.g. "ecwid.com") to the app serving it."""
+        self.apps = apps
+        self._transports = {
+            suffix: httpx.ASGITransport(app=app)
+            for suffix, app in apps.items()
+        }
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        for suffix, transport in self._transports.items():
+            if host.endswith(suffix):
+                return await transport.handle_async_request(request)
+        return httpx.Response(502, json={"error": f"No fake upstream for {host}"})
+
+    def request_counts(self) -> Dict[str, int]:
+        return {suffix: app.state.request_count for suffix, app in self.apps.items()}
+
+
+def build_upstream_transport(
+    ecwid_faults: FaultProfile,
+    zoho_faults: FaultProfile,
+    product_ids: int = 1000
+) -> UpstreamTransport:
+    return UpstreamTransport({
+        "ecwid.com": build_ecwid_app(ecwid_faults, product_ids=product_ids),
+        "accounts.zoho.eu": build_zoho_accounts_app(FaultProfile()),
+        "zohoapis.eu": build_zoho_app(zoho_faults),
+    })
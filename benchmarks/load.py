@@ -0,0 +1,313 @@
+"""End-to-end load benchmark for main.app.
+
+Runs the app in-process against fake Ecwid/Zoho upstreams and a real Postgres
+(the DB_* settings; use a scratch database, it gets seeded with a bench store
+and items). Sends signed synthetic webhooks for all Zoho and Ecwid types, waits
+until the job queue has drained and reports:
+
+- acknowledgement latency (p50/p95/p99) of the webhook endpoints
+- processing throughput (webhooks per second, from first request to empty queue)
+- DB round trips per webhook and upstream requests per webhook
+
+    python -m benchmarks.load --webhooks 2000 --concurrency 50 --output bench.json
+    python -m benchmarks.load --baseline bench.json --tolerance 0.2
+
+With --baseline the run fails if throughput drops or p95 latency grows by more
+than the tolerance.
+
+The upstream rate limits are raised (--zoho-requests-per-minute,
+--ecwid-requests-per-minute) so that the token buckets don't cap the result;
+the values used are part of the report. Order updates and deletes go to
+seeded orders that already have a Zoho sales order.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+
+from typing import Any, Dict, List, Tuple
+
+import httpx
+import orjson
+
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+import main
+
+from core import async_session_maker, get_engine, settings
+from core.config import RateLimitSettings
+from models import JOB_PENDING, JOB_RUNNING, ORDER_CREATED, Items, Job, Orders, Stores, ZohoTokens
+from utils.clients import open_http_pools
+from .fake_upstreams import FaultProfile, build_upstream_transport
+
+BENCH_ORGANIZATION_ID = "bench-org"
+
+ZOHO_SECRETS = {
+    "inventory-adjustment": settings.zoho_settings.zoho_inventory_adjustment_secret,
+    "sales": settings.zoho_settings.zoho_fbm_sales_secret,
+    "purchase": settings.zoho_settings.zoho_purchase_secret,
+    "transfer": settings.zoho_settings.zoho_transfer_secret,
+}
+ECWID_EVENT_TYPES = ["order.created", "order.updated", "order.deleted"]
+
+
+class RoundTripCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args: Any) -> None:
+        self.count += 1
+
+
+async def seed(items: int, orders: int) -> List[str]:
+    """Seed the bench store, its items and `orders` synced orders; returns the order ids."""
+    async with async_session_maker() as db:
+        await db.execute(pg_insert(Stores).values(
+            zoho_organization_id=BENCH_ORGANIZATION_ID,
+            ecwid_store_id=settings.ecwid_settings.ecwid_store_id
+        ).on_conflict_do_nothing())
+        store = (await db.execute(
+            select(Stores).where(Stores.zoho_organization_id == BENCH_ORGANIZATION_ID)
+        )).scalar_one()
+
+        await db.execute(pg_insert(ZohoTokens).values(
+            store_id=store.id,
+            access_token=f"bench-{uuid.uuid4().hex}",
+            refresh_token=f"bench-{uuid.uuid4().hex}",
+            expires_in=0
+        ).on_conflict_do_nothing())
+        await db.execute(pg_insert(Items).values([
+            {"zoho_item_id": f"bench-{n}", "ecwid_item_id": n, "store_id": store.id}
+            for n in range(1, items + 1)
+        ]).on_conflict_do_nothing())
+        order_ids = [f"BENCHSEED{n}" for n in range(1, orders + 1)]
+        if order_ids:
+            await db.execute(pg_insert(Orders).values([
+                {
+                    "ecwid_order_id": order_id,
+                    "zoho_order_id": f"bench-{order_id}",
+                    "store_id": store.id,
+                    "status": ORDER_CREATED
+                }
+                for order_id in order_ids
+            ]).on_conflict_do_nothing())
+        await db.commit()
+        return order_ids
+
+
+def line_items(items: int, quantity_field: str) -> List[Dict[str, Any]]:
+    return [
+        {
+            "item_id": f"bench-{random.randint(1, items)}",
+            "warehouse_id": settings.zoho_settings.zoho_warehouse_id,
+            quantity_field: random.randint(1, 5),
+        }
+        for _ in range(random.randint(1, 10))
+    ]
+
+
+def zoho_payload(webhook_type: str, items: int) -> Dict[str, Any]:
+    event_id = uuid.uuid4().hex
+    if webhook_type == "inventory-adjustment":
+        return {"inventory_adjustment": {
+            "inventory_adjustment_id": event_id,
+            "adjustment_type": "quantity",
+            "line_items": line_items(items, "quantity_adjusted"),
+        }}
+    if webhook_type == "sales":
+        return {"salesorder": {
+            "salesorder_id": event_id,
+            "customer_id": settings.zoho_settings.amazon_customer_id,
+            "line_items": line_items(items, "quantity"),
+        }}
+    if webhook_type == "purchase":
+        return {"purchaseorder": {"purchaseorder_id": event_id, "line_items": line_items(items, "quantity")}}
+    return {"transfer_order": {"transfer_order_id": event_id, "line_items": line_items(items, "quantity_transfer")}}
+
+
+def ecwid_payload(event_type: str, order_ids: List[str]) -> Dict[str, Any]:
+    """Updates and deletes only go to `order_ids`: others would wait for their create with backoff."""
+    if event_type == "order.created" or not order_ids:
+        order_id = f"BENCH{uuid.uuid4().hex[:10].upper()}"
+        event_type, data = "order.created", {"orderId": order_id, "newPaymentStatus": "PAID"}
+    elif event_type == "order.updated":
+        data = {"orderId": random.choice(order_ids), "oldPaymentStatus": "AWAITING_PAYMENT", "newPaymentStatus": "PAID"}
+    else:
+        data = {"orderId": random.choice(order_ids)}
+
+    return {
+        "eventId": uuid.uuid4().hex,
+        "eventCreated": int(time.time()),
+        "storeId": settings.ecwid_settings.ecwid_store_id,
+        "eventType": event_type,
+        "data": data,
+    }
+
+
+def build_request(items: int, order_ids: List[str]) -> Tuple[str, str, bytes, Dict[str, str]]:
+    """Returns (kind, url, body, headers) for a random webhook."""
+    if random.random() < 0.75:
+        webhook_type = random.choice(list(ZOHO_SECRETS))
+        body = orjson.dumps(zoho_payload(webhook_type, items))
+        signature = hmac.new(ZOHO_SECRETS[webhook_type].encode(), body, hashlib.sha256).hexdigest()
+        headers = {
+            "x-zoho-webhook-signature": signature,
+            "x-com-zoho-organizationid": BENCH_ORGANIZATION_ID,
+            "content-type": "application/json",
+        }
+        return f"zoho:{webhook_type}", f"/zoho-webhooks/{webhook_type}", body, headers
+
+    payload = ecwid_payload(random.choice(ECWID_EVENT_TYPES), order_ids)
+    body = orjson.dumps(payload)
+    return f"ecwid:{payload['eventType']}", "/ecwid-webhooks/sales", body, {"content-type": "application/json"}
+
+
+async def queue_depth() -> int:
+    async with async_session_maker() as db:
+        stmt = select(func.count()).select_from(Job).where(Job.status.in_([JOB_PENDING, JOB_RUNNING]))
+        return (await db.execute(stmt)).scalar_one()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return round(ordered[index], 2)
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    transport = build_upstream_transport(
+        FaultProfile(args.ecwid_latency, args.jitter, args.error_rate, args.rate_limit_rate),
+        FaultProfile(args.zoho_latency, args.jitter, args.error_rate, args.rate_limit_rate),
+        product_ids=args.items,
+    )
+    await open_http_pools(transport=transport)
+    # The configured quotas would cap the throughput long before the app does
+    settings.rate_limit_settings = RateLimitSettings(
+        zoho_requests_per_minute=args.zoho_requests_per_minute,
+        zoho_requests_per_day=0,
+        ecwid_requests_per_minute=args.ecwid_requests_per_minute,
+    )
+    rate_limits = {
+        "zoho_requests_per_minute": args.zoho_requests_per_minute,
+        "ecwid_requests_per_minute": args.ecwid_requests_per_minute,
+    }
+    print(f"rate limits: {rate_limits}", file=sys.stderr)
+    order_ids = await seed(args.items, args.orders)
+
+    round_trips = RoundTripCounter()
+    event.listen(get_engine().sync_engine, "before_cursor_execute", round_trips)
+
+    latencies: Dict[str, List[float]] = {}
+    statuses: Dict[int, int] = {}
+    requests = [build_request(args.items, order_ids) for _ in range(args.webhooks)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+            async def send(kind: str, url: str, body: bytes, headers: Dict[str, str]) -> None:
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.post(url, content=body, headers=headers)
+                    latencies.setdefault(kind, []).append((time.perf_counter() - start) * 1000)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(send(*request) for request in requests))
+            acknowledged = time.perf_counter() - started
+
+            while await queue_depth():
+                if time.perf_counter() - started > args.drain_timeout:
+                    raise TimeoutError("Job queue did not drain in time")
+                await asyncio.sleep(0.2)
+            processed = time.perf_counter() - started
+
+    event.remove(get_engine().sync_engine, "before_cursor_execute", round_trips)
+
+    all_latencies = [latency for values in latencies.values() for latency in values]
+    upstream_requests = transport.request_counts()
+    return {
+        "webhooks": args.webhooks,
+        "concurrency": args.concurrency,
+        "rate_limits": rate_limits,
+        "statuses": statuses,
+        "ack_seconds": round(acknowledged, 3),
+        "processing_seconds": round(processed, 3),
+        "throughput_per_second": round(args.webhooks / processed, 2),
+        "latency_ms": {
+            "p50": percentile(all_latencies, 50),
+            "p95": percentile(all_latencies, 95),
+            "p99": percentile(all_latencies, 99),
+            "mean": round(statistics.fmean(all_latencies), 2) if all_latencies else 0.0,
+        },
+        "latency_ms_by_type": {
+            kind: {"p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99)}
+            for kind, values in sorted(latencies.items())
+        },
+        "db_round_trips_per_webhook": round(round_trips.count / args.webhooks, 2),
+        "upstream_requests": upstream_requests,
+        "upstream_requests_per_webhook": round(sum(upstream_requests.values()) / args.webhooks, 2),
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    if result["throughput_per_second"] < baseline["throughput_per_second"] * (1 - tolerance):
+        regressions.append(
+            f"throughput {result['throughput_per_second']}/s < baseline {baseline['throughput_per_second']}/s"
+        )
+    if result["latency_ms"]["p95"] > baseline["latency_ms"]["p95"] * (1 + tolerance):
+        regressions.append(f"p95 {result['latency_ms']['p95']}ms > baseline {baseline['latency_ms']['p95']}ms")
+    if result["db_round_trips_per_webhook"] > baseline["db_round_trips_per_webhook"] * (1 + tolerance):
+        regressions.append(
+            f"db round trips {result['db_round_trips_per_webhook']} > baseline {baseline['db_round_trips_per_webhook']}"
+        )
+    return regressions
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--webhooks", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--items", type=int, default=1000, help="number of mapped bench items to seed")
+    parser.add_argument("--orders", type=int, default=100, help="number of synced bench orders to seed")
+    parser.add_argument("--zoho-requests-per-minute", type=int, default=1_000_000)
+    parser.add_argument("--ecwid-requests-per-minute", type=int, default=1_000_000)
+    parser.add_argument("--ecwid-latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--zoho-latency", type=float, default=0.1, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--drain-timeout", type=float, default=600.0)
+    parser.add_argument("--seed", type=int, default=0, help="random seed for reproducible payloads")
+    parser.add_argument("--output", help="write the result JSON here")
+    parser.add_argument("--baseline", help="compare against a previous result JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
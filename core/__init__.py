@@ -1,5 +1,8 @@
+from .cache import MISSING, TTLCache
 from .config import settings
 from .database import (
     async_session_maker, 
-    engine,
-)
\ No newline at end of file
+    get_engine,
+    release_connection,
+)
+from .singleflight import SingleFlight
\ No newline at end of file
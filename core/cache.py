@@ -0,0 +1,60 @@
+import time
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Tuple, TypeVar
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+# Returned by TTLCache.get on a miss, so that a cached None (negative result)
+# can be told apart from a key that was never cached.
+MISSING: Any = object()
+
+
+class TTLCache(Generic[K, V]):
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[K, Tuple[float, V]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K) -> V:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < self._clock():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: K, value: V) -> None:
+        self._data[key] = (self._clock() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: K) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
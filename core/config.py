@@ -1,3 +1,5 @@
+from functools import cached_property
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Base(BaseSettings):
@@ -20,7 +22,20 @@ class DatabaseSettings(Base):
     DB_USER: str
     DB_PASS: str
     DB_NAME: str
-    
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    # Seconds; connections older than this are replaced on checkout
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # asyncpg prepared statements cached per connection; ignored in pgbouncer mode
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # Running behind PgBouncer in transaction pooling mode
+    DB_PGBOUNCER: bool = False
+    # LISTEN needs a session-level connection: with PgBouncer point these at Postgres itself
+    DB_DIRECT_HOST: str = ""
+    DB_DIRECT_PORT: int = 0
+
     @property
     def db_url(self) -> str:
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
@@ -28,10 +43,152 @@ class DatabaseSettings(Base):
 class EcwidSettings(Base):
     ecwid_app_secret: str
     ecwid_store_id: int
+    ecwid_stock_concurrency: int = 10
+    ecwid_stock_retries: int = 2
+    ecwid_retry_backoff: float = 0.5
+    # 0 disables coalescing of stock deltas
+    ecwid_coalesce_window_ms: int = 0
+    # Webhooks with more mapped items than this go through the batch API; 0 disables it
+    ecwid_batch_threshold: int = 10
+    ecwid_batch_size: int = 100
+    ecwid_batch_poll_interval: float = 0.5
+    ecwid_batch_timeout: float = 60.0
+    # Updates of an order without a row are retried while the order is younger than this (seconds)
+    ecwid_order_sync_window: float = 3600.0
+
+class ServerSettings(Base):
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    # uvicorn worker processes; rate limits are split evenly between them
+    server_workers: int = 1
+    # Load stores, prime the items cache and open DB connections before serving
+    server_warmup: bool = True
+
+class HTTPSettings(Base):
+    http_timeout: float = 10.0
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http2: bool = False
+
+class CacheSettings(Base):
+    items_cache_ttl: float = 300.0
+    items_cache_maxsize: int = 10000
+    contacts_cache_ttl: float = 86400.0
+    contacts_cache_maxsize: int = 50000
+    # Store rows (and their API clients) are reloaded this often
+    stores_refresh_interval: float = 300.0
+    # An unknown store triggers a reload at most this often
+    stores_miss_reload_interval: float = 10.0
+    # Follow item/store/token changes made by other processes through LISTEN/NOTIFY
+    cache_invalidation_listen: bool = True
+    cache_invalidation_heartbeat: float = 30.0
+
+class JobsSettings(Base):
+    jobs_concurrency: int = 4
+    jobs_poll_interval: float = 1.0
+    jobs_max_attempts: int = 5
+    jobs_retry_backoff: float = 5.0
+    jobs_retry_backoff_max: float = 600.0
+    # Running jobs refresh their lock every third of this, so only a dead worker's jobs time out
+    jobs_visibility_timeout: float = 300.0
+    # On shutdown, in-flight jobs get this long to finish before they are cancelled
+    jobs_shutdown_grace: float = 30.0
+
+class RateLimitSettings(Base):
+    zoho_requests_per_minute: int = 100
+    # 0 disables the daily quota bucket
+    zoho_requests_per_day: int = 0
+    ecwid_requests_per_minute: int = 600
+    rate_limit_max_retries: int = 5
+    rate_limit_default_retry_after: float = 60.0
+
+class IdempotencySettings(Base):
+    idempotency_ttl: float = 172800.0
+    idempotency_cache_maxsize: int = 50000
+    idempotency_purge_interval: float = 3600.0
+
+class ReconciliationSettings(Base):
+    reconcile_chunk_size: int = 100
+    reconcile_concurrency: int = 5
+
+class WebhookLogSettings(Base):
+    # Months of webhooks/webhook_items to keep; 0 keeps everything
+    webhook_log_retention_months: int = 12
+    # Expired partitions are moved to the `archive` schema instead of dropped
+    webhook_log_archive: bool = False
+    webhook_log_partitions_ahead: int = 3
+    webhook_log_maintenance_interval: float = 21600.0
+
+class AuditSettings(Base):
+    audit_queue_maxsize: int = 10000
+    # A batch is flushed at this many rows or after the interval, whichever comes first
+    audit_batch_rows: int = 500
+    audit_flush_interval_ms: int = 200
+    audit_flush_retries: int = 3
+    # Webhook ids reserved from the sequence per round trip
+    audit_id_block_size: int = 100
+
+class DiagnosticsSettings(Base):
+    # Empty disables the /admin endpoints
+    admin_token: str = ""
+    slow_webhook_threshold_ms: int = 5000
+    profiler_interval_ms: float = 5.0
+    profiler_max_seconds: float = 120.0
 
 class Settings:
-    zoho_settings = ZohoSettings()
-    database_settings = DatabaseSettings()
-    ecwid_settings = EcwidSettings()
+    """Each section is read from the environment/.env on first access."""
+
+    @cached_property
+    def zoho_settings(self) -> ZohoSettings:
+        return ZohoSettings()
+
+    @cached_property
+    def database_settings(self) -> DatabaseSettings:
+        return DatabaseSettings()
+
+    @cached_property
+    def ecwid_settings(self) -> EcwidSettings:
+        return EcwidSettings()
+
+    @cached_property
+    def server_settings(self) -> ServerSettings:
+        return ServerSettings()
+
+    @cached_property
+    def http_settings(self) -> HTTPSettings:
+        return HTTPSettings()
+
+    @cached_property
+    def cache_settings(self) -> CacheSettings:
+        return CacheSettings()
+
+    @cached_property
+    def jobs_settings(self) -> JobsSettings:
+        return JobsSettings()
+
+    @cached_property
+    def rate_limit_settings(self) -> RateLimitSettings:
+        return RateLimitSettings()
+
+    @cached_property
+    def idempotency_settings(self) -> IdempotencySettings:
+        return IdempotencySettings()
+
+    @cached_property
+    def diagnostics_settings(self) -> DiagnosticsSettings:
+        return DiagnosticsSettings()
+
+    @cached_property
+    def reconciliation_settings(self) -> ReconciliationSettings:
+        return ReconciliationSettings()
+
+    @cached_property
+    def webhook_log_settings(self) -> WebhookLogSettings:
+        return WebhookLogSettings()
+
+    @cached_property
+    def audit_settings(self) -> AuditSettings:
+        return AuditSettings()
 
 settings = Settings()
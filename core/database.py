@@ -1,12 +1,93 @@
-from typing import AsyncGenerator
+import time
+
+from typing import Any, Callable, Dict, Optional
+from uuid import uuid4
+
 from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from .config import DatabaseSettings, settings
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that reports how long each checkout waited for a connection.
+
+    `observe_wait` is set by whoever collects the numbers (utils.metrics),
+    so core does not depend on the metrics code.
+    """
+
+    observe_wait: Optional[Callable[[float], None]] = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.observe_wait is not None:
+                self.observe_wait(time.perf_counter() - started)
+
+
+def _engine_options(db_settings: DatabaseSettings) -> Dict[str, Any]:
+    if db_settings.DB_PGBOUNCER:
+        # PgBouncer in transaction mode hands each transaction to any server
+        # connection, so named prepared statements must be neither cached nor reused
+        connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    else:
+        connect_args = {"prepared_statement_cache_size": db_settings.DB_STATEMENT_CACHE_SIZE}
+
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": db_settings.DB_POOL_SIZE,
+        "max_overflow": db_settings.DB_MAX_OVERFLOW,
+        "pool_timeout": db_settings.DB_POOL_TIMEOUT,
+        "pool_recycle": db_settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": db_settings.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+
+_engine: Optional[AsyncEngine] = None
+_session_maker: Optional[async_sessionmaker[AsyncSession]] = None
+
+
+def get_engine() -> AsyncEngine:
+    """The process-wide engine, created on first use.
+
+    Building it loads the database settings and imports asyncpg, which
+    importing the app (a serverless cold start) shouldn't pay for.
+    """
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(
+            settings.database_settings.db_url,
+            **_engine_options(settings.database_settings)
+        )
+    return _engine
+
+
+def async_session_maker() -> AsyncSession:
+    global _session_maker
+    if _session_maker is None:
+        _session_maker = async_sessionmaker(bind=get_engine(), class_=AsyncSession, expire_on_commit=False)
+    return _session_maker()
 
-from .config import settings
 
-engine = create_async_engine(settings.database_settings.db_url)
+async def release_connection(db: AsyncSession) -> None:
+    """Give the session's connection back to the pool before a slow non-DB step.
 
-async_session_maker = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    A session checks a connection out on its first query and keeps it until
+    the transaction ends, so a handler that reads a few rows and then waits
+    on Ecwid or Zoho would hold it for the whole HTTP round trip. The session
+    stays usable (the next query checks a connection out again) and objects
+    already loaded stay readable, just detached.
+    """
+    await db.close()
@@ -0,0 +1,22 @@
+import asyncio
+
+from typing import Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+class SingleFlight(Generic[K, V]):
+    """Runs at most one call per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        self._calls: Dict[K, asyncio.Future] = {}
+
+    async def do(self, key: K, fn: Callable[[], Awaitable[V]]) -> V:
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = asyncio.ensure_future(fn())
+            call.add_done_callback(lambda _: self._calls.pop(key, None))
+
+        # Shielded so that one cancelled caller doesn't cancel the call for everyone else
+        return await asyncio.shield(call)
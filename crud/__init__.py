@@ -1 +1 @@
-from .base import ItemsCRUD, StoresCRUD, ZohoTokensCRUD, OrdersCRUD, WebhookCRUD, WebhookItemCRUD
\ No newline at end of file
+from .base import ItemsCRUD, JobsCRUD, StoresCRUD, ZohoContactsCRUD, ZohoTokensCRUD, OrdersCRUD, ProcessedWebhooksCRUD, WebhookCRUD, WebhookItemCRUD, WebhookPartitionsCRUD
\ No newline at end of file
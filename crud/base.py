@@ -1,24 +1,36 @@
 
 
-from typing import Generic, TypeVar, Type, ClassVar, Any
+from datetime import date, datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Generic, Iterable, List, Optional, Tuple, TypeVar, Type, ClassVar, Any
 
-from sqlalchemy import insert, select, update
+from sqlalchemy import Integer, String, and_, any_, bindparam, delete, func, insert, or_, select, text, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import DeclarativeBase
 
-
-
+from core.cache import MISSING, TTLCache
+from core.config import settings
 from models import (
+    JOB_DEAD,
+    JOB_PENDING,
+    JOB_RUNNING,
+    ORDER_PENDING,
     Items,
+    Job,
     Orders,
+    ProcessedWebhook,
     Stores,
+    ZohoContact,
     ZohoTokens,
+    WEBHOOKS_ID_SEQ,
     Webhook,
     WebhookItem
 )
 
 M = TypeVar('M', bound='DeclarativeBase')
 
+BULK_INSERT_CHUNK_SIZE = 1000
+
 class BaseCRUD(Generic[M]):
     model: ClassVar[Type[M]]
 
@@ -57,20 +69,275 @@ class BaseCRUD(Generic[M]):
         await db.commit()
 
         return entity
+
+    @classmethod
+    async def create_entities(
+        cls,
+        db: AsyncSession,
+        rows: List[Dict[str, Any]],
+        commit: bool = True
+    ) -> None:
+        if not rows:
+            raise ValueError("No data provided for create")
+
+        # One multi-row INSERT per chunk, kept well below asyncpg's 32767 bind parameter limit
+        for start in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+            chunk = rows[start:start + BULK_INSERT_CHUNK_SIZE]
+            await db.execute(insert(cls.model).values(chunk))
+
+        if commit:
+            await db.commit()
     
         
 class ItemsCRUD(BaseCRUD[Items]):
     model = Items
+    # Keys are ("zoho", store_id, zoho_item_id) and ("ecwid", ecwid_item_id).
+    # Misses are cached as None so unmapped items don't hit the database either.
+    _cache: ClassVar[Optional[TTLCache]] = None
+    # Bumped by every invalidation, see _fill_cache
+    _generation: ClassVar[int] = 0
+
+    @classmethod
+    def cache(cls) -> TTLCache:
+        if cls._cache is None:
+            cls._cache = TTLCache(
+                maxsize=settings.cache_settings.items_cache_maxsize,
+                ttl=settings.cache_settings.items_cache_ttl,
+            )
+        return cls._cache
+
+    @classmethod
+    def _fill_cache(cls, generation: int, entries: Iterable[Tuple[Tuple, Optional[Items]]]) -> bool:
+        """Cache rows read since `generation`; returns False (caching nothing) if it is stale.
+
+        An invalidation that arrived while the query was in flight may be for a
+        commit the query didn't see, so its rows would put the old data back.
+        """
+        if generation != cls._generation:
+            return False
+        cache = cls.cache()
+        for key, item in entries:
+            cache.set(key, item)
+        return True
+
+    @classmethod
+    async def find_by_zoho_item_id(
+        cls,
+        db: AsyncSession,
+        store_id: int,
+        zoho_item_id: str
+    ) -> Optional[Items]:
+        key = ("zoho", store_id, zoho_item_id)
+        item = cls.cache().get(key)
+        if item is MISSING:
+            generation = cls._generation
+            item = await cls.find_one_or_none(db, store_id=store_id, zoho_item_id=zoho_item_id)
+            cls._fill_cache(generation, [(key, item)])
+        return item
+
+    @classmethod
+    async def find_by_ecwid_item_id(
+        cls,
+        db: AsyncSession,
+        ecwid_item_id: int
+    ) -> Optional[Items]:
+        key = ("ecwid", ecwid_item_id)
+        item = cls.cache().get(key)
+        if item is MISSING:
+            generation = cls._generation
+            item = await cls.find_one_or_none(db, ecwid_item_id=ecwid_item_id)
+            cls._fill_cache(generation, [(key, item)])
+        return item
+
+    @classmethod
+    async def find_many_by_zoho_item_ids(
+        cls,
+        db: AsyncSession,
+        store_id: int,
+        zoho_item_ids: Iterable[str]
+    ) -> Dict[str, Items]:
+        found: Dict[str, Items] = {}
+        missing = []
+        for zoho_item_id in set(zoho_item_ids):
+            item = cls.cache().get(("zoho", store_id, zoho_item_id))
+            if item is MISSING:
+                missing.append(zoho_item_id)
+            elif item is not None:
+                found[zoho_item_id] = item
+
+        if missing:
+            generation = cls._generation
+            # A single array parameter keeps the statement text stable for any
+            # number of ids, unlike an expanding IN (...)
+            stmt = select(cls.model).where(
+                cls.model.store_id == store_id,
+                cls.model.zoho_item_id == any_(bindparam("zoho_item_ids", missing, type_=ARRAY(String))),
+            )
+            result = await db.execute(stmt)
+            for item in result.scalars():
+                found[item.zoho_item_id] = item
+            cls._fill_cache(generation, (
+                (("zoho", store_id, zoho_item_id), found.get(zoho_item_id)) for zoho_item_id in missing
+            ))
+
+        return found
+
+    @classmethod
+    async def find_many_by_ecwid_item_ids(
+        cls,
+        db: AsyncSession,
+        ecwid_item_ids: Iterable[int]
+    ) -> Dict[int, Items]:
+        found: Dict[int, Items] = {}
+        missing = []
+        for ecwid_item_id in set(ecwid_item_ids):
+            item = cls.cache().get(("ecwid", ecwid_item_id))
+            if item is MISSING:
+                missing.append(ecwid_item_id)
+            elif item is not None:
+                found[ecwid_item_id] = item
+
+        if missing:
+            generation = cls._generation
+            stmt = select(cls.model).where(
+                cls.model.ecwid_item_id == any_(bindparam("ecwid_item_ids", missing, type_=ARRAY(Integer))),
+            )
+            result = await db.execute(stmt)
+            for item in result.scalars():
+                found[item.ecwid_item_id] = item
+            cls._fill_cache(generation, (
+                (("ecwid", ecwid_item_id), found.get(ecwid_item_id)) for ecwid_item_id in missing
+            ))
+
+        return found
+
+    @classmethod
+    async def iter_chunks(
+        cls,
+        db: AsyncSession,
+        store_id: int,
+        chunk_size: int
+    ) -> AsyncIterator[List[Items]]:
+        """Yield the store's items `chunk_size` at a time, paging by primary key.
+
+        The items are detached and the read transaction is ended before each
+        yield, so slow consumers neither grow the session nor hold a snapshot open.
+        """
+        last_id = 0
+        while True:
+            stmt = (
+                select(cls.model)
+                .where(cls.model.store_id == store_id, cls.model.id > last_id)
+                .order_by(cls.model.id)
+                .limit(chunk_size)
+            )
+            chunk = list((await db.execute(stmt)).scalars())
+            if not chunk:
+                return
+            db.expunge_all()
+            await db.rollback()
+            yield chunk
+            last_id = chunk[-1].id
+
+    @classmethod
+    async def prime_cache(cls, db: AsyncSession, store_id: int, limit: int) -> int:
+        """Load up to `limit` of the store's items into the cache; returns how many were loaded.
+
+        Stops early if the cache is invalidated meanwhile; the rest is loaded on first use.
+        """
+        generation = cls._generation
+        primed = 0
+        async for chunk in cls.iter_chunks(db, store_id, min(limit, 1000)):
+            chunk = chunk[:limit - primed]
+            entries = []
+            for item in chunk:
+                entries.append((("zoho", item.store_id, item.zoho_item_id), item))
+                entries.append((("ecwid", item.ecwid_item_id), item))
+            if not cls._fill_cache(generation, entries):
+                break
+            primed += len(chunk)
+            if primed >= limit:
+                break
+        return primed
+
+    @classmethod
+    def invalidate_cache(cls, item: Optional[Items] = None) -> None:
+        cls._generation += 1
+        if item is None:
+            cls.cache().clear()
+            return
+
+        cls.cache().invalidate(("zoho", item.store_id, item.zoho_item_id))
+        cls.cache().invalidate(("ecwid", item.ecwid_item_id))
+
+    @classmethod
+    async def patch_entity(cls, db: AsyncSession, entity: Items, **data: Any) -> Items:
+        cls.invalidate_cache(entity)
+        entity = await super().patch_entity(db, entity, **data)
+        cls.invalidate_cache(entity)
+        return entity
+
+    @classmethod
+    async def create_entity(cls, db: AsyncSession, **data: Any) -> Items:
+        entity = await super().create_entity(db, **data)
+        cls.invalidate_cache(entity)
+        return entity
 
 class StoresCRUD(BaseCRUD[Stores]):
     model = Stores
 
+    @classmethod
+    async def find_all(cls, db: AsyncSession) -> List[Stores]:
+        result = await db.execute(select(cls.model).order_by(cls.model.id))
+        return list(result.scalars())
+
 class OrdersCRUD(BaseCRUD[Orders]):
     model = Orders
 
+    @classmethod
+    async def claim(
+        cls,
+        db: AsyncSession,
+        store_id: int,
+        ecwid_order_id: str,
+        status: str = ORDER_PENDING
+    ) -> Optional[Orders]:
+        """Insert a row for the order; None if another attempt already has one."""
+        stmt = (
+            pg_insert(cls.model)
+            .values(store_id=store_id, ecwid_order_id=ecwid_order_id, status=status)
+            .on_conflict_do_nothing(index_elements=[cls.model.ecwid_order_id])
+            .returning(cls.model)
+        )
+        order = (await db.execute(stmt)).scalar_one_or_none()
+        await db.commit()
+        return order
+
+    @classmethod
+    async def release(cls, db: AsyncSession, order: Orders) -> None:
+        """Drop a claim whose Zoho sales order was never created."""
+        await db.execute(delete(cls.model).where(cls.model.id == order.id, cls.model.status == ORDER_PENDING))
+        await db.commit()
+
+    @classmethod
+    async def set_status(cls, db: AsyncSession, order: Orders, status: str, **data: Any) -> None:
+        """Like patch_entity, for orders that are no longer attached to `db`."""
+        await db.execute(update(cls.model).where(cls.model.id == order.id).values(status=status, **data))
+        await db.commit()
+        order.status = status
+        for key, value in data.items():
+            setattr(order, key, value)
+
 class ZohoTokensCRUD(BaseCRUD[ZohoTokens]):
     model = ZohoTokens
 
+    @classmethod
+    async def find_for_update(cls, db: AsyncSession, store_id: int) -> Optional[ZohoTokens]:
+        """Lock the store's token row until the transaction ends, serialising refreshes across workers."""
+        stmt = select(cls.model).filter_by(store_id=store_id).with_for_update()
+        result = await db.execute(stmt)
+        return result.scalars().one_or_none()
+
     @classmethod
     async def find_and_patch(
         cls,
@@ -88,9 +355,291 @@ class ZohoTokensCRUD(BaseCRUD[ZohoTokens]):
         
         await cls.create_entity(db, access_token=access_token, refresh_token=refresh_token)
 
+class ZohoContactsCRUD(BaseCRUD[ZohoContact]):
+    model = ZohoContact
+
+    @classmethod
+    async def save(cls, db: AsyncSession, store_id: int, email: str, contact_id: str) -> None:
+        stmt = pg_insert(cls.model).values(
+            store_id=store_id,
+            email=email,
+            contact_id=contact_id
+        ).on_conflict_do_update(
+            index_elements=[cls.model.store_id, cls.model.email],
+            set_={"contact_id": contact_id}
+        )
+        await db.execute(stmt)
+        await db.commit()
+
 class WebhookCRUD(BaseCRUD[Webhook]):
     model = Webhook
 
+    @classmethod
+    async def create_with_items(
+        cls,
+        db: AsyncSession,
+        type: str,
+        items: List[Dict[str, Any]]
+    ) -> Webhook:
+        """Write a webhook and all of its audit items in a single transaction."""
+        query = insert(cls.model).values(type=type).returning(cls.model)
+        webhook = (await db.execute(query)).scalar_one()
+
+        if items:
+            await WebhookItemCRUD.create_entities(
+                db,
+                [{"webhook_id": webhook.id, "webhook_created_at": webhook.created_at, **item} for item in items],
+                commit=False
+            )
+        await db.commit()
+
+        return webhook
+
+    @classmethod
+    async def reserve_ids(cls, db: AsyncSession, count: int) -> List[int]:
+        stmt = select(WEBHOOKS_ID_SEQ.next_value()).select_from(func.generate_series(1, count))
+        return list((await db.execute(stmt)).scalars())
+
+    @classmethod
+    async def copy_with_items(
+        cls,
+        db: AsyncSession,
+        webhooks: List[Tuple[int, str, datetime]],
+        items: List[Tuple[int, datetime, int, int]]
+    ) -> None:
+        """Bulk-load audit rows with COPY in one transaction.
+
+        `webhooks` rows are (id, type, created_at) with ids from reserve_ids;
+        `items` rows are (webhook_id, webhook_created_at, item_id, quantity).
+        """
+        conn = await db.connection()
+        driver = (await conn.get_raw_connection()).driver_connection
+        async with driver.transaction():
+            if webhooks:
+                await driver.copy_records_to_table(
+                    cls.model.__tablename__,
+                    records=webhooks,
+                    columns=["id", "type", "created_at"]
+                )
+            if items:
+                await driver.copy_records_to_table(
+                    WebhookItemCRUD.model.__tablename__,
+                    records=items,
+                    columns=["webhook_id", "webhook_created_at", "item_id", "quantity"]
+                )
+
 class WebhookItemCRUD(BaseCRUD[WebhookItem]):
     model = WebhookItem
 
+class WebhookPartitionsCRUD:
+    """Monthly partitions of webhooks and webhook_items.
+
+    Both tables are partitioned by the webhook's created_at, so a month is
+    always created and removed as a pair: webhooks_pYYYYMM and
+    webhook_items_pYYYYMM. Callers commit.
+    """
+    parent: ClassVar[str] = "webhooks"
+    child: ClassVar[str] = "webhook_items"
+    archive_schema: ClassVar[str] = "archive"
+
+    @staticmethod
+    def month_bounds(month: date) -> Tuple[datetime, datetime]:
+        start = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+        end = datetime(month.year + month.month // 12, month.month % 12 + 1, 1, tzinfo=timezone.utc)
+        return start, end
+
+    @staticmethod
+    def partition_name(table: str, month: date) -> str:
+        return f"{table}_p{month:%Y%m}"
+
+    @classmethod
+    async def lock(cls, db: AsyncSession) -> None:
+        """Serialize partition maintenance between workers until the transaction ends."""
+        await db.execute(text("SELECT pg_advisory_xact_lock(hashtext('webhook_partitions'))"))
+
+    @classmethod
+    async def find_months(cls, db: AsyncSession) -> List[date]:
+        stmt = text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :parent"
+        )
+        months = []
+        for (name,) in await db.execute(stmt, {"parent": cls.parent}):
+            suffix = name.rsplit("_p", 1)[-1]
+            if len(suffix) == 6 and suffix.isdigit():
+                months.append(date(int(suffix[:4]), int(suffix[4:]), 1))
+        return sorted(months)
+
+    @classmethod
+    async def create_month(cls, db: AsyncSession, month: date) -> bool:
+        """Create the month's partitions; False if rows for it already landed in the default partition."""
+        start, end = cls.month_bounds(month)
+        in_default = await db.execute(
+            text(f"SELECT EXISTS (SELECT 1 FROM {cls.parent}_default WHERE created_at >= :start AND created_at < :end)"),
+            {"start": start, "end": end}
+        )
+        if in_default.scalar_one():
+            return False
+
+        conn = await db.connection()
+        for table in (cls.parent, cls.child):
+            # Driver-level SQL: the bounds are literals and their colons would read as bind parameters in text()
+            await conn.exec_driver_sql(
+                f"CREATE TABLE IF NOT EXISTS {cls.partition_name(table, month)} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+        return True
+
+    @classmethod
+    async def drop_month(cls, db: AsyncSession, month: date, archive: bool = False) -> None:
+        """Drop (or detach into the archive schema) a month of both tables.
+
+        The webhook_items partition goes first: webhooks rows can't leave
+        while webhook_items still references them.
+        """
+        parent_partition = cls.partition_name(cls.parent, month)
+        child_partition = cls.partition_name(cls.child, month)
+
+        if archive:
+            await db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {cls.archive_schema}"))
+            await db.execute(text(f"ALTER TABLE {cls.child} DETACH PARTITION {child_partition}"))
+            await db.execute(text(f"ALTER TABLE {child_partition} DROP CONSTRAINT webhook_items_webhook_fkey"))
+            await db.execute(text(f"ALTER TABLE {cls.parent} DETACH PARTITION {parent_partition}"))
+            for partition in (child_partition, parent_partition):
+                await db.execute(text(f"ALTER TABLE {partition} SET SCHEMA {cls.archive_schema}"))
+        else:
+            await db.execute(text(f"DROP TABLE {child_partition}"))
+            await db.execute(text(f"ALTER TABLE {cls.parent} DETACH PARTITION {parent_partition}"))
+            await db.execute(text(f"DROP TABLE {parent_partition}"))
+
+class JobsCRUD(BaseCRUD[Job]):
+    model = Job
+
+    @classmethod
+    async def enqueue(
+        cls,
+        db: AsyncSession,
+        kind: str,
+        payload: Dict[str, Any],
+        commit: bool = True
+    ) -> Job:
+        stmt = (
+            insert(cls.model)
+            .values(kind=kind, payload=payload, max_attempts=settings.jobs_settings.jobs_max_attempts)
+            .returning(cls.model)
+        )
+        job = (await db.execute(stmt)).scalar_one()
+        if commit:
+            await db.commit()
+        return job
+
+    @classmethod
+    async def claim(
+        cls,
+        db: AsyncSession,
+        limit: int = 1
+    ) -> List[Job]:
+        """Lock up to `limit` due jobs for this worker.
+
+        Jobs left in `running` for longer than the visibility timeout belong
+        to a worker that died mid-flight and are claimed again.
+        """
+        now = datetime.now(timezone.utc)
+        stale_before = now - timedelta(seconds=settings.jobs_settings.jobs_visibility_timeout)
+        due = (
+            select(cls.model.id)
+            .where(or_(
+                and_(cls.model.status == JOB_PENDING, cls.model.run_at <= now),
+                and_(cls.model.status == JOB_RUNNING, cls.model.locked_at < stale_before),
+            ))
+            .order_by(cls.model.run_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(cls.model)
+            .where(cls.model.id.in_(due.scalar_subquery()))
+            .values(status=JOB_RUNNING, locked_at=now, attempts=cls.model.attempts + 1)
+            .returning(cls.model)
+        )
+        result = await db.execute(stmt)
+        jobs = list(result.scalars())
+        await db.commit()
+        return jobs
+
+    @classmethod
+    async def heartbeat(cls, db: AsyncSession, job_ids: List[int]) -> None:
+        """Push back the visibility timeout of jobs that are still being worked on."""
+        stmt = (
+            update(cls.model)
+            .where(cls.model.id.in_(job_ids), cls.model.status == JOB_RUNNING)
+            .values(locked_at=datetime.now(timezone.utc))
+        )
+        await db.execute(stmt)
+        await db.commit()
+
+    @classmethod
+    async def save_progress(cls, db: AsyncSession, job: Job, progress: Dict[str, Any]) -> None:
+        await db.execute(update(cls.model).where(cls.model.id == job.id).values(progress=progress))
+        await db.commit()
+
+    @classmethod
+    async def complete(cls, db: AsyncSession, job: Job) -> None:
+        await db.execute(delete(cls.model).where(cls.model.id == job.id))
+        await db.commit()
+
+    @classmethod
+    async def fail(cls, db: AsyncSession, job: Job, error: str) -> None:
+        jobs_settings = settings.jobs_settings
+        if job.attempts >= job.max_attempts:
+            data = {"status": JOB_DEAD}
+        else:
+            delay = min(
+                jobs_settings.jobs_retry_backoff * 2 ** (job.attempts - 1),
+                jobs_settings.jobs_retry_backoff_max
+            )
+            data = {
+                "status": JOB_PENDING,
+                "run_at": datetime.now(timezone.utc) + timedelta(seconds=delay)
+            }
+
+        stmt = (
+            update(cls.model)
+            .where(cls.model.id == job.id)
+            .values(locked_at=None, last_error=error, **data)
+        )
+        await db.execute(stmt)
+        await db.commit()
+
+    @classmethod
+    async def count_by_status(cls, db: AsyncSession) -> Dict[str, int]:
+        stmt = select(cls.model.status, func.count()).group_by(cls.model.status)
+        result = await db.execute(stmt)
+        return dict(result.all())
+
+
+class ProcessedWebhooksCRUD(BaseCRUD[ProcessedWebhook]):
+    model = ProcessedWebhook
+
+    @classmethod
+    async def claim(cls, db: AsyncSession, key: str, ttl: float, commit: bool = True) -> bool:
+        """Record `key` as processed; False if it was already recorded and hasn't expired."""
+        now = datetime.now(timezone.utc)
+        stmt = pg_insert(cls.model).values(key=key, created_at=now, expires_at=now + timedelta(seconds=ttl))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.model.key],
+            set_={"created_at": stmt.excluded.created_at, "expires_at": stmt.excluded.expires_at},
+            where=cls.model.expires_at < now,
+        ).returning(cls.model.key)
+        result = await db.execute(stmt)
+        claimed = result.scalar_one_or_none() is not None
+        if commit:
+            await db.commit()
+        return claimed
+
+    @classmethod
+    async def purge_expired(cls, db: AsyncSession) -> None:
+        await db.execute(delete(cls.model).where(cls.model.expires_at < datetime.now(timezone.utc)))
+        await db.commit()
@@ -1,20 +1,90 @@
-from ecwid_api import EcwidApi
+import logging
+import time
+
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Tuple
+
 from fastapi import (
-    BackgroundTasks,
     Depends, 
     FastAPI,
     HTTPException,
-    Path,
-    Request
+    Query,
+    Request,
+    Response
 )
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import PlainTextResponse
 
 
-from utils.generators import get_ecwid_api, get_db, get_zoho_api
+from core import async_session_maker, get_engine, settings
+from crud import JobsCRUD
+from models import JOB_DEAD, JOB_PENDING, JOB_RUNNING
+from utils.audit import get_audit_sink
+from utils.clients import close_http_pools, open_http_pools
+from utils.idempotency import build_idempotency_key
+from utils.invalidation import get_cache_invalidation_listener
+from utils.jobs import enqueue_job, register_job_handler, start_job_workers, stop_job_workers
+from utils.metrics import (
+    JOB_QUEUE_DEPTH,
+    WEBHOOK_ACK_SECONDS,
+    WEBHOOK_PROCESSING_SECONDS,
+    instrument_engine,
+    mark_worker_dead,
+    render_metrics
+)
+from utils.partitions import get_partition_maintainer
+from utils.profiler import ProfilerBusyError, get_profiler
+from utils.rate_limit import rate_limiter
 from utils.security import *
+from utils.stores import get_store_registry
+from utils.tracing import trace
+from utils.warmup import warm_up_worker
 from utils.webhooks_hanlers import *
 
-app = FastAPI()
+ZOHO_WEBHOOK_JOB = "zoho-webhook"
+ECWID_WEBHOOK_JOB = "ecwid-webhook"
+ECWID_EVENT_TYPES = {"order.created", "order.updated", "order.deleted"}
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    instrument_engine(get_engine())
+    await open_http_pools()
+    cache_invalidation_listener = get_cache_invalidation_listener()
+    store_registry = get_store_registry()
+    audit_sink = get_audit_sink()
+    partition_maintainer = get_partition_maintainer()
+    if settings.cache_settings.cache_invalidation_listen:
+        cache_invalidation_listener.start()
+        # Connecting clears the caches, so it has to happen before they are primed
+        if not await cache_invalidation_listener.wait_connected(timeout=5):
+            logger.warning("Cache invalidation listener not connected; caches may serve changes late")
+    if settings.server_settings.server_warmup:
+        try:
+            await warm_up_worker()
+        except Exception:
+            # Everything warmed up here is also loaded on first use
+            logger.exception("Worker warm-up failed")
+    store_registry.start()
+    audit_sink.start()
+    await start_job_workers()
+    partition_maintainer.start()
+    try:
+        yield
+    finally:
+        await partition_maintainer.stop()
+        await drain_stock_coalescer()
+        await stop_job_workers()
+        # After the workers, so the audit rows of their last webhooks are flushed
+        await audit_sink.stop()
+        await store_registry.stop()
+        await cache_invalidation_listener.stop()
+        await close_http_pools()
+        mark_worker_dead()
+
+
+app = FastAPI(lifespan=lifespan)
 
 def get_handler(
     webhook_type: str,
@@ -33,61 +103,159 @@ def get_handler(
                 status_code=400,
                 detail="Unknown webhook type"
             )
-        
-def get_validator(
-    webhook_type: str = Path(...),
-) -> type[WebhookHandlerProtocol]:
-    match webhook_type:
-        case "inventory-adjustment":
-            return ZohoInventoryWebhookValidator
-        case "sales":
-            return ZohoSalesWebhookValidator
-        case "purchase":
-            return ZohoPurchaseWebhookValidator
-        case "transfer":
-            return ZohoTransferWebhookValidator
-        case _:
-            raise HTTPException(
-                status_code=400,
-                detail="Unknown webhook type"
-            )
+
+
+async def process_zoho_webhook(job_payload: Dict[str, Any]) -> None:
+    webhook_type = job_payload["webhook_type"]
+    started = time.perf_counter()
+    outcome = "failed"
+    async with async_session_maker() as db:
+        try:
+            handler = get_handler(webhook_type)
+            with trace(f"zoho {webhook_type} webhook", organization=job_payload["zoho_organization_id"]):
+                store_clients = await get_store_registry().by_zoho_organization(job_payload["zoho_organization_id"])
+                await handler.update_ecwid_stock_from_webhook(
+                    job_payload["payload"],
+                    store_clients.store,
+                    store_clients.ecwid_api,
+                    db,
+                    webhook_type
+                )
+            outcome = "processed"
+        except HTTPException as exc:
+            # Only deliberate rejections (unsupported type, adjustment or customer) complete the job;
+            # an unknown store (possibly not loaded yet) or a failed token refresh is retried
+            if exc.status_code != 400:
+                raise
+            outcome = "no_action"
+            logger.info("%s webhook: no action taken: %s", webhook_type, exc.detail)
+        finally:
+            WEBHOOK_PROCESSING_SECONDS.labels("zoho", webhook_type, outcome).observe(time.perf_counter() - started)
+
+register_job_handler(ZOHO_WEBHOOK_JOB, process_zoho_webhook)
 
 
 @app.post("/zoho-webhooks/{webhook_type}")
 async def adjust_eckwid_stock(
     request: Request,
     webhook_type: str,
-    background_tasks: BackgroundTasks,
-    db: AsyncSession = Depends(get_db),
-    ecwid_api: EcwidApi = Depends(get_ecwid_api),
+    verified: Tuple[bytes, Dict[str, Any]] = Depends(verify_zoho_webhook),
     handler: type[WebhookHandlerProtocol] = Depends(get_handler),
-    validator: type[WebhookValidatorProtocol] = Depends(get_validator),
 ) -> dict:
-    if not validator.validate(request):
-        raise HTTPException(status_code=403, detail="Invalid signature")
+    started = time.perf_counter()
+    body, payload = verified
+    zoho_organization_id = request.headers.get("x-com-zoho-organizationid")
+
+    key = build_idempotency_key(
+        f"zoho:{zoho_organization_id}:{webhook_type}",
+        handler.get_event_id(payload),
+        body
+    )
     try:
-        payload = await request.json()
-        zoho_organization_id = request.headers.get("x-com-zoho-organizationid")
-        background_tasks.add_task(handler.update_ecwid_stock_from_webhook, payload, zoho_organization_id, ecwid_api, db, webhook_type)
-        return {"status": "received"}
-    except HTTPException as exc:
-        return {"status": "no action taken", "message": exc.detail}
+        job = await enqueue_job(ZOHO_WEBHOOK_JOB, {
+            "webhook_type": webhook_type,
+            "zoho_organization_id": zoho_organization_id,
+            "payload": payload
+        }, idempotency_key=key)
+    except Exception:
+        WEBHOOK_ACK_SECONDS.labels("zoho", webhook_type, "error").observe(time.perf_counter() - started)
+        raise
+    if job is None:
+        WEBHOOK_ACK_SECONDS.labels("zoho", webhook_type, "duplicate").observe(time.perf_counter() - started)
+        return {"status": "duplicate"}
+    WEBHOOK_ACK_SECONDS.labels("zoho", webhook_type, "received").observe(time.perf_counter() - started)
+    return {"status": "received"}
     
 
     
+def ecwid_event_label(event_type: Any) -> str:
+    # Ecwid sends many more event types than we handle; keep the label set bounded
+    return event_type if event_type in ECWID_EVENT_TYPES else "other"
+
+
+async def process_ecwid_webhook(data: Dict[str, Any]) -> None:
+    event_type = data.get('eventType')
+    started = time.perf_counter()
+    outcome = "failed"
+    async with async_session_maker() as db:
+        try:
+            with trace(f"ecwid {event_type} webhook", event_id=data.get('eventId')):
+                store_clients = await get_store_registry().by_ecwid_store(data.get('storeId'))
+                await handle_ecwid_webhook(
+                    db,
+                    store_clients.store,
+                    event_type,
+                    data.get('data'),
+                    store_clients.ecwid_api,
+                    store_clients.zoho_api
+                )
+            outcome = "processed"
+        except HTTPException as exc:
+            # Only an unsupported event type completes the job; anything else is retried
+            if exc.status_code != 400:
+                raise
+            outcome = "no_action"
+            logger.info("Ecwid %s webhook: no action taken: %s", event_type, exc.detail)
+        finally:
+            WEBHOOK_PROCESSING_SECONDS.labels("ecwid", ecwid_event_label(event_type), outcome).observe(
+                time.perf_counter() - started
+            )
+
+register_job_handler(ECWID_WEBHOOK_JOB, process_ecwid_webhook)
+
+
 @app.post("/ecwid-webhooks/sales")
 async def create_zoho_inventory_sales_order(
     request: Request,
-    db: AsyncSession = Depends(get_db),
-    ecwid_api: EcwidApi = Depends(get_ecwid_api),
 ) -> dict:
-    data = await request.json()
-    zoho_api = await get_zoho_api(data, db)
-    event_type = data.get('eventType')
-    event_data = data.get('data')
+    started = time.perf_counter()
+    body = await request.body()
+    data = decode_json_body(body)
+    event_type = ecwid_event_label(data.get('eventType'))
+
+    key = build_idempotency_key(
+        f"ecwid:{data.get('storeId')}",
+        data.get('eventId'),
+        body
+    )
     try:
-        await handle_ecwid_webhook(db, event_type, event_data, ecwid_api, zoho_api)
-    except Exception as e:
-        print(e)
-    
-    return {"status": "ok"}
\ No newline at end of file
+        job = await enqueue_job(ECWID_WEBHOOK_JOB, data, idempotency_key=key)
+    except Exception:
+        WEBHOOK_ACK_SECONDS.labels("ecwid", event_type, "error").observe(time.perf_counter() - started)
+        raise
+    if job is None:
+        WEBHOOK_ACK_SECONDS.labels("ecwid", event_type, "duplicate").observe(time.perf_counter() - started)
+        return {"status": "duplicate"}
+    WEBHOOK_ACK_SECONDS.labels("ecwid", event_type, "received").observe(time.perf_counter() - started)
+    return {"status": "ok"}
+
+
+@app.get("/rate-limits", dependencies=[Depends(verify_admin_token)])
+async def get_rate_limits() -> dict:
+    return rate_limiter.snapshot()
+
+
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    async with async_session_maker() as db:
+        depth = await JobsCRUD.count_by_status(db)
+    for status in (JOB_PENDING, JOB_RUNNING, JOB_DEAD):
+        JOB_QUEUE_DEPTH.labels(status).set(depth.get(status, 0))
+
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+
+@app.post("/admin/profile", dependencies=[Depends(verify_admin_token)])
+async def run_profiler(
+    seconds: float = Query(10.0, gt=0),
+) -> PlainTextResponse:
+    """Sample all threads for `seconds` and return folded stacks for flamegraph.pl / speedscope."""
+    max_seconds = settings.diagnostics_settings.profiler_max_seconds
+    if seconds > max_seconds:
+        raise HTTPException(status_code=422, detail=f"seconds must be at most {max_seconds:g}")
+    try:
+        folded = await get_profiler().profile(seconds)
+    except ProfilerBusyError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return PlainTextResponse(folded)
@@ -0,0 +1,131 @@
+"""partition webhook log tables
+
+Revision ID: a3c91e5d2b74
+Revises: fc405eb51a0b
+Create Date: 2026-10-18 19:02:41.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c91e5d2b74'
+down_revision: Union[str, None] = 'fc405eb51a0b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Monthly partitions from the oldest existing row up to this many months ahead
+PARTITIONS_AHEAD = 3
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Move the old tables (and the names of their indexes) aside; the sequences are kept for the new ids
+    op.rename_table('webhook_items', 'webhook_items_legacy')
+    op.rename_table('webhooks', 'webhooks_legacy')
+    op.execute("ALTER INDEX webhooks_pkey RENAME TO webhooks_legacy_pkey")
+    op.execute("ALTER INDEX webhook_items_pkey RENAME TO webhook_items_legacy_pkey")
+    op.execute("ALTER INDEX ix_webhook_items_webhook_id RENAME TO ix_webhook_items_legacy_webhook_id")
+    for sequence in ('webhooks_id_seq', 'webhook_items_id_seq'):
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+        op.execute(f"ALTER SEQUENCE {sequence} AS bigint")
+
+    op.create_table('webhooks',
+    sa.Column('id', sa.BigInteger(), server_default=sa.text("nextval('webhooks_id_seq')"), nullable=False),
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'created_at'),
+    postgresql_partition_by='RANGE (created_at)'
+    )
+    op.create_index(op.f('ix_webhooks_created_at'), 'webhooks', ['created_at'], unique=False)
+    op.create_table('webhook_items',
+    sa.Column('id', sa.BigInteger(), server_default=sa.text("nextval('webhook_items_id_seq')"), nullable=False),
+    sa.Column('webhook_id', sa.BigInteger(), nullable=False),
+    sa.Column('webhook_created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['item_id'], ['items.id'], ),
+    sa.ForeignKeyConstraint(['webhook_id', 'webhook_created_at'], ['webhooks.id', 'webhooks.created_at'], name='webhook_items_webhook_fkey'),
+    sa.PrimaryKeyConstraint('id', 'webhook_created_at'),
+    postgresql_partition_by='RANGE (webhook_created_at)'
+    )
+    op.create_index(op.f('ix_webhook_items_webhook_id'), 'webhook_items', ['webhook_id'], unique=False)
+    op.execute("ALTER SEQUENCE webhooks_id_seq OWNED BY webhooks.id")
+    op.execute("ALTER SEQUENCE webhook_items_id_seq OWNED BY webhook_items.id")
+
+    op.execute("CREATE TABLE webhooks_default PARTITION OF webhooks DEFAULT")
+    op.execute("CREATE TABLE webhook_items_default PARTITION OF webhook_items DEFAULT")
+    op.execute(f"""
+        DO $$
+        DECLARE
+            month timestamp := date_trunc('month', coalesce((SELECT min(created_at) FROM webhooks_legacy), now()) AT TIME ZONE 'UTC');
+            last_month timestamp := date_trunc('month', now() AT TIME ZONE 'UTC') + interval '{PARTITIONS_AHEAD} months';
+        BEGIN
+            WHILE month <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE webhooks_p%s PARTITION OF webhooks FOR VALUES FROM (%L) TO (%L)',
+                    to_char(month, 'YYYYMM'), month AT TIME ZONE 'UTC', (month + interval '1 month') AT TIME ZONE 'UTC'
+                );
+                EXECUTE format(
+                    'CREATE TABLE webhook_items_p%s PARTITION OF webhook_items FOR VALUES FROM (%L) TO (%L)',
+                    to_char(month, 'YYYYMM'), month AT TIME ZONE 'UTC', (month + interval '1 month') AT TIME ZONE 'UTC'
+                );
+                month := month + interval '1 month';
+            END LOOP;
+        END $$
+    """)
+
+    op.execute("INSERT INTO webhooks (id, type, created_at) SELECT id, type, created_at FROM webhooks_legacy")
+    op.execute("""
+        INSERT INTO webhook_items (id, webhook_id, webhook_created_at, item_id, quantity)
+        SELECT i.id, i.webhook_id, w.created_at, i.item_id, i.quantity
+        FROM webhook_items_legacy i
+        JOIN webhooks_legacy w ON w.id = i.webhook_id
+    """)
+    op.drop_table('webhook_items_legacy')
+    op.drop_table('webhooks_legacy')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Archived (detached) partitions are not restored
+    op.rename_table('webhook_items', 'webhook_items_partitioned')
+    op.rename_table('webhooks', 'webhooks_partitioned')
+    op.execute("ALTER INDEX webhooks_pkey RENAME TO webhooks_partitioned_pkey")
+    op.execute("ALTER INDEX webhook_items_pkey RENAME TO webhook_items_partitioned_pkey")
+    op.execute("ALTER INDEX ix_webhook_items_webhook_id RENAME TO ix_webhook_items_partitioned_webhook_id")
+    op.execute("ALTER INDEX ix_webhooks_created_at RENAME TO ix_webhooks_partitioned_created_at")
+    for sequence in ('webhooks_id_seq', 'webhook_items_id_seq'):
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+
+    op.create_table('webhooks',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('webhooks_id_seq')"), nullable=False),
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('webhook_items',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('webhook_items_id_seq')"), nullable=False),
+    sa.Column('webhook_id', sa.Integer(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['item_id'], ['items.id'], ),
+    sa.ForeignKeyConstraint(['webhook_id'], ['webhooks.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_webhook_items_webhook_id'), 'webhook_items', ['webhook_id'], unique=False)
+    op.execute("ALTER SEQUENCE webhooks_id_seq OWNED BY webhooks.id")
+    op.execute("ALTER SEQUENCE webhook_items_id_seq OWNED BY webhook_items.id")
+    op.execute("ALTER SEQUENCE webhooks_id_seq AS integer")
+    op.execute("ALTER SEQUENCE webhook_items_id_seq AS integer")
+
+    op.execute("INSERT INTO webhooks (id, type, created_at) SELECT id, type, created_at FROM webhooks_partitioned")
+    op.execute("""
+        INSERT INTO webhook_items (id, webhook_id, item_id, quantity)
+        SELECT id, webhook_id, item_id, quantity FROM webhook_items_partitioned
+    """)
+    op.drop_table('webhook_items_partitioned')
+    op.drop_table('webhooks_partitioned')
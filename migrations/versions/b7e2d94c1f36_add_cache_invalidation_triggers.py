@@ -0,0 +1,71 @@
+"""add cache invalidation triggers
+
+Revision ID: b7e2d94c1f36
+Revises: a3c91e5d2b74
+Create Date: 2026-10-18 21:14:08.502917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2d94c1f36'
+down_revision: Union[str, None] = 'a3c91e5d2b74'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Table -> columns the application caches are keyed by (tokens themselves never go into a payload)
+TRIGGER_COLUMNS = {
+    'items': ('store_id', 'zoho_item_id', 'ecwid_item_id'),
+    'stores': ('id',),
+    'zoho_tokens': ('store_id',),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Notifications are sent on commit, so listeners never see uncommitted changes
+    op.execute("""
+        CREATE FUNCTION notify_cache_invalidation() RETURNS trigger AS $$
+        DECLARE
+            payload jsonb := jsonb_build_object('table', TG_TABLE_NAME);
+        BEGIN
+            IF TG_LEVEL = 'ROW' AND TG_OP <> 'INSERT' THEN
+                payload := payload || jsonb_build_object('old', (
+                    SELECT jsonb_object_agg(key, value) FROM jsonb_each(to_jsonb(OLD)) WHERE key = ANY(TG_ARGV)
+                ));
+            END IF;
+            IF TG_LEVEL = 'ROW' AND TG_OP <> 'DELETE' THEN
+                payload := payload || jsonb_build_object('new', (
+                    SELECT jsonb_object_agg(key, value) FROM jsonb_each(to_jsonb(NEW)) WHERE key = ANY(TG_ARGV)
+                ));
+            END IF;
+            PERFORM pg_notify('cache_invalidation', payload::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table, columns in TRIGGER_COLUMNS.items():
+        arguments = ", ".join(f"'{column}'" for column in columns)
+        op.execute(f"""
+            CREATE TRIGGER {table}_cache_invalidation
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION notify_cache_invalidation({arguments})
+        """)
+        # No row data: listeners drop everything they cached from the table
+        op.execute(f"""
+            CREATE TRIGGER {table}_cache_invalidation_truncate
+            AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidation()
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TRIGGER_COLUMNS:
+        op.execute(f"DROP TRIGGER {table}_cache_invalidation_truncate ON {table}")
+        op.execute(f"DROP TRIGGER {table}_cache_invalidation ON {table}")
+    op.execute("DROP FUNCTION notify_cache_invalidation()")
@@ -0,0 +1,34 @@
+"""make orders ecwid_order_id unique
+
+Revision ID: c4f18a2e9d63
+Revises: b7e2d94c1f36
+Create Date: 2026-10-19 10:42:17.306518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f18a2e9d63'
+down_revision: Union[str, None] = 'b7e2d94c1f36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # One orders row per Ecwid order: a retried order.created job can't save a second one.
+    # Remove duplicate rows (and the extra Zoho sales orders) before upgrading.
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_orders_ecwid_order_id'), table_name='orders', postgresql_concurrently=True)
+        op.create_index(op.f('ix_orders_ecwid_order_id'), 'orders', ['ecwid_order_id'], unique=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_orders_ecwid_order_id'), table_name='orders', postgresql_concurrently=True)
+        op.create_index(op.f('ix_orders_ecwid_order_id'), 'orders', ['ecwid_order_id'], unique=False, postgresql_concurrently=True)
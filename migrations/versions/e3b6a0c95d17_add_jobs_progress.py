@@ -0,0 +1,29 @@
+"""add jobs progress
+
+Revision ID: e3b6a0c95d17
+Revises: c4f18a2e9d63
+Create Date: 2026-10-20 09:14:52.481337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b6a0c95d17'
+down_revision: Union[str, None] = 'c4f18a2e9d63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # What a job already did, so its retries don't repeat non-idempotent calls
+    op.add_column('jobs', sa.Column('progress', postgresql.JSONB(astext_type=sa.Text()), server_default=sa.text("'{}'::jsonb"), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('jobs', 'progress')
@@ -0,0 +1,32 @@
+"""add orders status
+
+Revision ID: f19c7d3b8a42
+Revises: e3b6a0c95d17
+Create Date: 2026-10-20 11:37:05.902164
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f19c7d3b8a42'
+down_revision: Union[str, None] = 'e3b6a0c95d17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rows are claimed (pending, no Zoho id yet) before the Zoho sales order is created
+    op.add_column('orders', sa.Column('status', sa.String(), server_default='created', nullable=False))
+    op.alter_column('orders', 'zoho_order_id', existing_type=sa.String(), nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM orders WHERE zoho_order_id IS NULL")
+    op.alter_column('orders', 'zoho_order_id', existing_type=sa.String(), nullable=False)
+    op.drop_column('orders', 'status')
@@ -0,0 +1,40 @@
+"""add hot path indexes
+
+Revision ID: fc405eb51a0b
+Revises: d71a85ba0f90
+Create Date: 2026-10-18 16:27:15.604832
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fc405eb51a0b'
+down_revision: Union[str, None] = 'd71a85ba0f90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY keeps the tables writable while the indexes build; it can't run inside a transaction.
+    # ix_items_store_id_zoho_item_id is unique: remove duplicate mappings before upgrading.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_items_store_id_zoho_item_id', 'items', ['store_id', 'zoho_item_id'], unique=True, postgresql_concurrently=True)
+        op.create_index(op.f('ix_items_ecwid_item_id'), 'items', ['ecwid_item_id'], unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_orders_ecwid_order_id'), 'orders', ['ecwid_order_id'], unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_webhook_items_webhook_id'), 'webhook_items', ['webhook_id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_jobs_running_locked_at', 'jobs', ['locked_at'], unique=False, postgresql_where=sa.text("status = 'running'"), postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_jobs_running_locked_at', table_name='jobs', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_webhook_items_webhook_id'), table_name='webhook_items', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_orders_ecwid_order_id'), table_name='orders', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_items_ecwid_item_id'), table_name='items', postgresql_concurrently=True)
+        op.drop_index('ix_items_store_id_zoho_item_id', table_name='items', postgresql_concurrently=True)
@@ -1,17 +1,31 @@
 from .base import Base
+from .contacts import ZohoContact
 from .items import Items
-from .orders import Orders
+from .jobs import JOB_DEAD, JOB_PENDING, JOB_RUNNING, Job
+from .orders import ORDER_CONFIRMED, ORDER_CREATED, ORDER_PENDING, ORDER_SKIPPED, Orders
+from .processed_webhooks import ProcessedWebhook
 from .stores import Stores
 from .tokens import ZohoTokens
-from .webhook import Webhook
+from .webhook import WEBHOOKS_ID_SEQ, Webhook
 from .webhooks_items import WebhookItem
 
 __all__ = [
     "Base",
     "Items",
+    "Job",
+    "JOB_DEAD",
+    "JOB_PENDING",
+    "JOB_RUNNING",
+    "ORDER_CONFIRMED",
+    "ORDER_CREATED",
+    "ORDER_PENDING",
+    "ORDER_SKIPPED",
     "Orders",
+    "ProcessedWebhook",
     "Stores",
+    "ZohoContact",
     "ZohoTokens",
+    "WEBHOOKS_ID_SEQ",
     "Webhook",
     "WebhookItem"
 ]
\ No newline at end of file
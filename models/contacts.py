@@ -0,0 +1,26 @@
+from sqlalchemy import (
+    ForeignKey,
+    Identity,
+    Integer,
+    String,
+    UniqueConstraint,
+)
+from sqlalchemy.orm import (
+    Mapped,
+    mapped_column
+)
+
+from .base import Base
+
+
+class ZohoContact(Base):
+    __tablename__ = "zoho_contacts"
+    __table_args__ = (
+        UniqueConstraint("store_id", "email"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, nullable=False, server_default=Identity())
+    store_id: Mapped[int] = mapped_column(Integer, ForeignKey("stores.id"), nullable=False)
+    # Stored lowercased
+    email: Mapped[str] = mapped_column(String, nullable=False)
+    contact_id: Mapped[str] = mapped_column(String, nullable=False)
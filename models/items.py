@@ -1,6 +1,7 @@
 from sqlalchemy import (
     ForeignKey,
     Identity, 
+    Index,
     Integer, 
     String, 
 )
@@ -14,10 +15,13 @@ from .base import Base
 
 class Items(Base):
     __tablename__ = "items"
+    __table_args__ = (
+        Index("ix_items_store_id_zoho_item_id", "store_id", "zoho_item_id", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, nullable=False, server_default=Identity())
     zoho_item_id: Mapped[str] = mapped_column(String, nullable=False)
-    ecwid_item_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    ecwid_item_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
     store_id: Mapped[int] = mapped_column(Integer, ForeignKey("stores.id"), nullable=False)
 
 
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from sqlalchemy import (
     ForeignKey,
     Identity, 
@@ -11,12 +13,20 @@ from sqlalchemy.orm import (
 
 from .base import Base
 
+# Claimed by an order.created job, Zoho sales order not (known to be) created yet
+ORDER_PENDING = "pending"
+ORDER_CREATED = "created"
+ORDER_CONFIRMED = "confirmed"
+# Deliberately not synced (no email or no mapped items); its updates are ignored
+ORDER_SKIPPED = "skipped"
+
 
 class Orders(Base):
     __tablename__ = "orders"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, nullable=False, server_default=Identity())
-    zoho_order_id: Mapped[str] = mapped_column(String, nullable=False)
-    ecwid_order_id: Mapped[str] = mapped_column(String, nullable=False)
+    zoho_order_id: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    ecwid_order_id: Mapped[str] = mapped_column(String, nullable=False, index=True, unique=True)
     store_id: Mapped[int] = mapped_column(Integer, ForeignKey("stores.id"), nullable=False)
+    status: Mapped[str] = mapped_column(String, nullable=False, server_default=ORDER_CREATED)
 
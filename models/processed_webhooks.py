@@ -0,0 +1,19 @@
+from datetime import datetime, timezone
+from sqlalchemy import (
+    DateTime,
+    String,
+)
+from sqlalchemy.orm import (
+    Mapped,
+    mapped_column
+)
+
+from .base import Base
+
+
+class ProcessedWebhook(Base):
+    __tablename__ = "processed_webhooks"
+
+    key: Mapped[str] = mapped_column(String, primary_key=True, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
@@ -1,9 +1,8 @@
 from datetime import datetime, timezone
 from sqlalchemy import (
+    BigInteger,
     DateTime,
-    ForeignKey,
-    Identity, 
-    Integer, 
+    Sequence,
     String, 
 )
 from sqlalchemy.orm import (
@@ -13,13 +12,20 @@ from sqlalchemy.orm import (
 
 from .base import Base
 
+# Standalone sequence: identity columns aren't supported on partitioned tables before Postgres 17
+WEBHOOKS_ID_SEQ = Sequence("webhooks_id_seq")
+
 
 class Webhook(Base):
+    """Audit log of processed webhooks, range-partitioned by month on created_at.
+
+    Partitions are named webhooks_pYYYYMM and are managed by utils.partitions;
+    webhooks_default catches rows outside every monthly partition.
+    """
     __tablename__ = "webhooks"
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, nullable=False)
+    id: Mapped[int] = mapped_column(BigInteger, WEBHOOKS_ID_SEQ, primary_key=True, server_default=WEBHOOKS_ID_SEQ.next_value())
     type: Mapped[str] = mapped_column(String, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
-
-
-    
\ No newline at end of file
+    # Part of the primary key because Postgres requires the partition key in unique constraints
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True, index=True, default=lambda: datetime.now(timezone.utc))
@@ -1,12 +1,11 @@
-from datetime import datetime, timezone
-from decimal import Decimal
+from datetime import datetime
 from sqlalchemy import (
-    DECIMAL,
+    BigInteger,
     DateTime,
     ForeignKey,
-    Identity, 
+    ForeignKeyConstraint,
     Integer, 
-    String, 
+    Sequence,
 )
 from sqlalchemy.orm import (
     Mapped,
@@ -15,15 +14,27 @@ from sqlalchemy.orm import (
 
 from .base import Base
 
+WEBHOOK_ITEMS_ID_SEQ = Sequence("webhook_items_id_seq")
+
 
 class WebhookItem(Base):
+    """Audit rows of a webhook, co-partitioned with webhooks by the parent's created_at.
+
+    A month of webhook_items always lives in the partition with the same
+    suffix as its webhooks, so both can be dropped together.
+    """
     __tablename__ = "webhook_items"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["webhook_id", "webhook_created_at"],
+            ["webhooks.id", "webhooks.created_at"],
+            name="webhook_items_webhook_fkey",
+        ),
+        {"postgresql_partition_by": "RANGE (webhook_created_at)"},
+    )
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, nullable=False)
-    webhook_id: Mapped[int] = mapped_column(Integer, ForeignKey("webhooks.id"), nullable=False)
+    id: Mapped[int] = mapped_column(BigInteger, WEBHOOK_ITEMS_ID_SEQ, primary_key=True, server_default=WEBHOOK_ITEMS_ID_SEQ.next_value())
+    webhook_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
+    webhook_created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
     item_id: Mapped[int] = mapped_column(Integer, ForeignKey("items.id"), nullable=False)
     quantity: Mapped[int] = mapped_column(Integer, nullable=False)
-    
-
-
-    
\ No newline at end of file
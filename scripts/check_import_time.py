@@ -0,0 +1,88 @@
+"""Cold-start budget check: how long `import main` takes in a fresh interpreter.
+
+Runs `python -X importtime -c "import main"` a few times, takes the fastest
+run (the others mostly measure disk cache and scheduler noise) and compares
+the cumulative import time of `main` with the budget. It also fails if
+importing main already built something that should be created on first use
+(the database engine, any settings section) or loaded the asyncpg driver.
+
+    python -m scripts.check_import_time
+    python -m scripts.check_import_time --budget-ms 1200 --top 20 --output imports.json
+
+Exits with status 1 if the budget is exceeded or something was built eagerly.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from typing import Dict, List, Tuple
+
+# About 1.4x the current ~730 ms, so a 2x regression fails
+DEFAULT_BUDGET_MS = 1000.0
+DEFAULT_RUNS = 3
+
+# Runs after `import main`; prints what importing it already initialised
+PROBE = (
+    "import main, core.database as d; "
+    "print('engine' if d._engine is not None else ''); "
+    "print(*(f'settings.{name}' for name in vars(d.settings)))"
+)
+
+
+def measure_once() -> Tuple[Dict[str, Tuple[int, int]], List[str]]:
+    """Returns {module: (self_us, cumulative_us)} and the names of eagerly built objects."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if completed.returncode != 0:
+        sys.exit(f"import main failed:\n{completed.stderr}")
+
+    modules = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    eager = [name for name in completed.stdout.split() if name]
+    return modules, eager
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument("--top", type=int, default=15, help="list the slowest modules by self time")
+    parser.add_argument("--output", help="write the per-module timings of the fastest run as JSON here")
+    args = parser.parse_args()
+
+    runs = [measure_once() for _ in range(max(args.runs, 1))]
+    modules, eager = min(runs, key=lambda run: run[0]["main"][1])
+    total_ms = modules["main"][1] / 1000
+
+    print(f"import main: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms, fastest of {len(runs)} runs)")
+    for name, (self_us, cumulative_us) in sorted(modules.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms cumulative  {name}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({name: {"self_us": s, "cumulative_us": c} for name, (s, c) in modules.items()}, f, indent=2)
+
+    failed = False
+    if total_ms > args.budget_ms:
+        print(f"FAIL: import time over budget by {total_ms - args.budget_ms:.1f} ms")
+        failed = True
+    if "asyncpg" in modules:
+        eager.append("asyncpg driver import")
+    if eager:
+        print(f"FAIL: built while importing main: {', '.join(eager)}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
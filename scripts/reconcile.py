@@ -0,0 +1,62 @@
+"""Full-stock reconciliation between Zoho (source of truth) and Ecwid.
+
+Dry-run by default: reports the items whose Ecwid quantity differs from the
+Zoho stock in the target warehouse. With --apply the Ecwid quantities are
+overwritten with the Zoho ones.
+
+    python -m scripts.reconcile
+    python -m scripts.reconcile --apply --store-id 1 --output report.json
+
+Runs periodically through reconcile.timer.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+
+from typing import Any, Dict, List, Optional
+
+from utils.clients import close_http_pools, open_http_pools
+from utils.reconciliation import reconcile_store
+from utils.stores import get_store_registry
+
+
+async def run(apply: bool, store_id: Optional[int]) -> List[Dict[str, Any]]:
+    store_registry = get_store_registry()
+    await store_registry.reload()
+    stores = store_registry.all()
+    if store_id is not None:
+        stores = [clients for clients in stores if clients.store.id == store_id]
+
+    await open_http_pools()
+    try:
+        reports = []
+        for clients in stores:
+            report = await reconcile_store(clients.store, clients.ecwid_api, clients.zoho_api, apply=apply)
+            reports.append(report.as_dict())
+        return reports
+    finally:
+        await close_http_pools()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apply", action="store_true", help="push Zoho quantities to Ecwid")
+    parser.add_argument("--store-id", type=int, help="only this store (stores.id)")
+    parser.add_argument("--output", help="write the reports as JSON here")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    reports = asyncio.run(run(args.apply, args.store_id))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+
+    # A dry run that finds drift is not a failure; failed pushes are
+    sys.exit(1 if any(report["failed"] for report in reports) else 0)
+
+
+if __name__ == "__main__":
+    main()
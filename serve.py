@@ -0,0 +1,52 @@
+"""Run the app under uvicorn with SERVER_WORKERS worker processes.
+
+    python serve.py
+
+Every worker is a separate process with its own DB pool, HTTP pools,
+caches and job workers; it warms them up on start (SERVER_WARMUP) and
+follows changes made by the other workers through LISTEN/NOTIFY.
+With several workers, set PROMETHEUS_MULTIPROC_DIR so that /metrics
+aggregates all of them; its contents are cleared here before start-up.
+
+This is the only supported way to run the app (see fastapi.service).
+Webhooks are processed by the job workers started in the app lifespan,
+so serverless platforms, which don't keep them running, would accept
+webhooks without ever processing them.
+"""
+import logging
+import os
+import shutil
+
+import uvicorn
+
+from core.config import ServerSettings
+
+logger = logging.getLogger(__name__)
+
+
+def reset_metrics_dir() -> None:
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not metrics_dir:
+        return
+    # Samples left by the previous run would be added to the new ones
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def main() -> None:
+    # Only the server settings: the rest is loaded by each worker
+    server_settings = ServerSettings()
+    if server_settings.server_workers > 1 and not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        logger.warning("PROMETHEUS_MULTIPROC_DIR is not set: /metrics will only show the worker that answers the scrape")
+    reset_metrics_dir()
+
+    uvicorn.run(
+        "main:app",
+        host=server_settings.server_host,
+        port=server_settings.server_port,
+        workers=server_settings.server_workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
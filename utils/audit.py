@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import time
+
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from core import SingleFlight, async_session_maker, settings
+from crud import WebhookCRUD
+from .metrics import AUDIT_DROPPED, AUDIT_FLUSH_SECONDS, AUDIT_QUEUE_DEPTH, AUDIT_ROWS
+
+logger = logging.getLogger(__name__)
+
+# (webhook_id, type, created_at, [(item_id, quantity), ...])
+AuditRecord = Tuple[int, str, datetime, List[Tuple[int, int]]]
+
+UNIQUE_VIOLATION = "23505"
+
+
+def _is_unique_violation(exc: BaseException) -> bool:
+    # COPY goes through the raw asyncpg connection, whose errors carry the
+    # SQLSTATE themselves; SQLAlchemy's keep the driver error in .orig
+    return UNIQUE_VIOLATION in (
+        getattr(exc, "sqlstate", None),
+        getattr(getattr(exc, "orig", None), "sqlstate", None),
+    )
+
+
+class AuditSink:
+    """Writes webhook audit rows off the request path.
+
+    Handlers get a webhook id straight away (ids are reserved from the
+    sequence in blocks) and the rows go through a bounded queue to a single
+    flusher task, which COPYs them in batches of `batch_rows` rows or every
+    `flush_interval` seconds. Records still queued are flushed on stop();
+    a crash loses at most the records not yet flushed.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        batch_rows: int,
+        flush_interval: float,
+        flush_retries: int,
+        id_block_size: int
+    ):
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.flush_retries = flush_retries
+        self.id_block_size = id_block_size
+        # None is the stop sentinel
+        self._queue: asyncio.Queue[Optional[AuditRecord]] = asyncio.Queue(maxsize=maxsize)
+        self._ids: Deque[int] = deque()
+        self._id_refills: SingleFlight[str, None] = SingleFlight()
+        self._flusher: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._flusher is not None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._run(), name="audit-sink")
+
+    async def stop(self) -> None:
+        if self._flusher is None:
+            return
+        await self._queue.put(None)
+        await self._flusher
+        self._flusher = None
+
+        # Records queued behind the sentinel
+        while not self._queue.empty():
+            await self._flush(self._take_batch())
+
+    async def log_webhook(self, type: str, items: List[Dict[str, Any]]) -> int:
+        """Record a webhook and its audit items; returns the webhook id."""
+        if not self.running:
+            async with async_session_maker() as db:
+                return (await WebhookCRUD.create_with_items(db, type, items)).id
+
+        webhook_id = await self._next_id()
+        record = (
+            webhook_id,
+            type,
+            datetime.now(timezone.utc),
+            [(item["item_id"], item["quantity"]) for item in items]
+        )
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            # Back-pressure instead of losing audit rows
+            logger.warning("Audit queue full (%d records), waiting for a flush", self._queue.maxsize)
+            await self._queue.put(record)
+        AUDIT_QUEUE_DEPTH.set(self._queue.qsize())
+        return webhook_id
+
+    async def _next_id(self) -> int:
+        while not self._ids:
+            await self._id_refills.do("webhooks", self._reserve_ids)
+        return self._ids.popleft()
+
+    async def _reserve_ids(self) -> None:
+        async with async_session_maker() as db:
+            self._ids.extend(await WebhookCRUD.reserve_ids(db, self.id_block_size))
+
+    def _take_batch(self) -> List[AuditRecord]:
+        batch, rows = [], 0
+        while rows < self.batch_rows and not self._queue.empty():
+            record = self._queue.get_nowait()
+            if record is not None:
+                batch.append(record)
+                rows += 1 + len(record[3])
+        AUDIT_QUEUE_DEPTH.set(self._queue.qsize())
+        return batch
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            record = await self._queue.get()
+            if record is None:
+                return
+
+            deadline = time.monotonic() + self.flush_interval
+            batch, rows = [record], 1 + len(record[3])
+            while rows < self.batch_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+                rows += 1 + len(record[3])
+
+            AUDIT_QUEUE_DEPTH.set(self._queue.qsize())
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[AuditRecord]) -> None:
+        if not batch:
+            return
+
+        webhooks = [(webhook_id, type, created_at) for webhook_id, type, created_at, _ in batch]
+        items = [
+            (webhook_id, created_at, item_id, quantity)
+            for webhook_id, _, created_at, record_items in batch
+            for item_id, quantity in record_items
+        ]
+        for attempt in range(self.flush_retries + 1):
+            started = time.perf_counter()
+            try:
+                async with async_session_maker() as db:
+                    await WebhookCRUD.copy_with_items(db, webhooks, items)
+            except Exception as e:
+                AUDIT_FLUSH_SECONDS.labels("error").observe(time.perf_counter() - started)
+                if not _is_unique_violation(e):
+                    logger.exception("Audit flush of %d webhooks failed (attempt %d)", len(webhooks), attempt + 1)
+                    if attempt < self.flush_retries:
+                        await asyncio.sleep(min(2 ** attempt, 30))
+                    continue
+                if not attempt:
+                    # Retrying can't fix a conflict that this batch didn't cause
+                    logger.exception("Audit flush of %d webhooks conflicts with existing rows", len(webhooks))
+                    break
+                # The batch is one transaction: the ids are there because an
+                # earlier attempt committed and only its reply was lost
+                logger.warning("Audit batch of %d webhooks already written by a previous attempt", len(webhooks))
+            else:
+                AUDIT_FLUSH_SECONDS.labels("success").observe(time.perf_counter() - started)
+
+            AUDIT_ROWS.labels("webhooks").inc(len(webhooks))
+            AUDIT_ROWS.labels("webhook_items").inc(len(items))
+            return
+
+        AUDIT_DROPPED.inc(len(batch))
+        logger.error("Dropping %d audit records after a failed flush: %s", len(batch), batch)
+
+
+_audit_sink: Optional[AuditSink] = None
+
+
+def get_audit_sink() -> AuditSink:
+    global _audit_sink
+    if _audit_sink is None:
+        audit_settings = settings.audit_settings
+        _audit_sink = AuditSink(
+            maxsize=audit_settings.audit_queue_maxsize,
+            batch_rows=audit_settings.audit_batch_rows,
+            flush_interval=audit_settings.audit_flush_interval_ms / 1000,
+            flush_retries=audit_settings.audit_flush_retries,
+            id_block_size=audit_settings.audit_id_block_size,
+        )
+    return _audit_sink
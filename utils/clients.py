@@ -0,0 +1,232 @@
+import asyncio
+import time
+
+from typing import Any, Awaitable, Callable, ClassVar, Dict, Hashable, Iterable, List, Optional
+
+import httpx
+
+from ecwid_api import EcwidApi, EcwidAuth, EcwidHTTPClient
+from ecwid_api.entities import OrdersClient, ProductsClient
+from zoho_api import AuthClient, Location, ZohoApi, ZohoHTTPClient
+from zoho_api.entities import (
+    ContactsClient,
+    ItemsClient,
+    OrganizationsClient,
+    SalesOrdersClient
+)
+
+from core import settings
+from .metrics import observe_upstream_request
+from .rate_limit import rate_limiter
+
+ECWID_POOL = "ecwid"
+ZOHO_POOL = "zoho"
+ZOHO_ACCOUNTS_POOL = "zoho_accounts"
+
+_pools: Dict[str, httpx.AsyncClient] = {}
+
+TokenProvider = Callable[[], Awaitable[str]]
+
+
+def _build_pool(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    http_settings = settings.http_settings
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(http_settings.http_timeout),
+        limits=httpx.Limits(
+            max_connections=http_settings.http_max_connections,
+            max_keepalive_connections=http_settings.http_max_keepalive_connections,
+            keepalive_expiry=http_settings.http_keepalive_expiry,
+        ),
+        # Uses `h2` (pinned in requirements.txt, as httpx[http2] would install it)
+        http2=http_settings.http2,
+        transport=transport,
+    )
+
+
+async def open_http_pools(
+    transport: Optional[httpx.AsyncBaseTransport] = None
+) -> None:
+    for name in (ECWID_POOL, ZOHO_POOL, ZOHO_ACCOUNTS_POOL):
+        if name not in _pools:
+            _pools[name] = _build_pool(transport)
+
+
+async def close_http_pools() -> None:
+    while _pools:
+        _, pool = _pools.popitem()
+        await pool.aclose()
+
+
+def get_http_pool(name: str) -> httpx.AsyncClient:
+    pool = _pools.get(name)
+    # Scripts and migrations run outside of the app lifespan
+    if pool is None or pool.is_closed:
+        pool = _pools[name] = _build_pool()
+    return pool
+
+
+class PooledRequestMixin:
+    pool_name: ClassVar[str]
+    rate_limit_key: Hashable
+
+    def _build_url(self, endpoint: str) -> str: ...
+
+    async def _refresh_auth(self) -> None:
+        """Hook for clients whose credentials can change over their lifetime."""
+
+    async def _request(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        data: Optional[Dict[str, Any]] = None,
+        json: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        await self._refresh_auth()
+        merged_headers = self.auth.get_auth_headers().copy()
+        if headers:
+            merged_headers.update(headers)
+
+        # No per-request timeout: the pool's HTTP_TIMEOUT applies, not the wheel clients' own default
+        pool = get_http_pool(self.pool_name)
+        retries = settings.rate_limit_settings.rate_limit_max_retries
+        for _ in range(retries + 1):
+            await rate_limiter.acquire(self.pool_name, self.rate_limit_key)
+            started = time.perf_counter()
+            try:
+                response = await pool.request(
+                    method=method,
+                    url=self._build_url(endpoint),
+                    params=params,
+                    data=data,
+                    json=json,
+                    headers=merged_headers,
+                )
+            except httpx.HTTPError:
+                observe_upstream_request(self.pool_name, method, endpoint, "error", started)
+                raise
+            observe_upstream_request(self.pool_name, method, endpoint, str(response.status_code), started)
+            # A 429 pauses the bucket, so the retry queues behind the upstream's reset
+            if rate_limiter.observe(self.pool_name, self.rate_limit_key, response) is None:
+                break
+        response.raise_for_status()
+
+        return response.json()
+
+
+class PooledEcwidHTTPClient(PooledRequestMixin, EcwidHTTPClient):
+    pool_name = ECWID_POOL
+
+    def __init__(self, auth: EcwidAuth):
+        super().__init__(auth)
+        self.rate_limit_key = auth.store_id
+
+    def _build_url(self, endpoint: str) -> str:
+        return self.auth.base_url + endpoint
+
+
+class PooledZohoHTTPClient(PooledRequestMixin, ZohoHTTPClient):
+    pool_name = ZOHO_POOL
+
+    def __init__(
+        self,
+        auth: AuthClient,
+        rate_limit_key: Hashable,
+        token_provider: Optional[TokenProvider] = None
+    ):
+        super().__init__(auth)
+        # Zoho quotas are per organization, not per access token
+        self.rate_limit_key = rate_limit_key
+        self.token_provider = token_provider
+
+    async def _refresh_auth(self) -> None:
+        # Long-lived clients outlive their access token; the provider is a cache hit until it expires
+        if self.token_provider is not None:
+            self.auth.access_token = await self.token_provider()
+
+    def _build_url(self, endpoint: str) -> str:
+        return f"{self.auth.base_url}/{endpoint}"
+
+
+class EcwidProductsClient(ProductsClient):
+    def adjust_product_stock_request(
+        self,
+        request_id: str,
+        product_id: int,
+        quantity: int
+    ) -> Dict[str, Any]:
+        """The batch sub-request equivalent of adjust_product_stock."""
+        return {
+            "id": request_id,
+            "path": f"{self._base_path}/{product_id}/inventory",
+            "method": "PUT",
+            "body": {"quantityDelta": quantity},
+        }
+
+
+class EcwidBatchClient:
+    """Ecwid's batch API: many sub-requests in one POST, results fetched by ticket."""
+
+    def __init__(self, client: EcwidHTTPClient):
+        self._client = client
+        self._base_path = "/batch"
+
+    async def submit(self, requests: List[Dict[str, Any]]) -> str:
+        response = await self._client.post(
+            self._base_path,
+            params={"stopOnFirstFailure": "false"},
+            data=requests
+        )
+        return response["ticket"]
+
+    async def get_result(self, ticket: str) -> Dict[str, Any]:
+        return await self._client.get(self._base_path, params={"ticket": ticket})
+
+    async def wait_for_result(
+        self,
+        ticket: str,
+        poll_interval: float,
+        timeout: float
+    ) -> Dict[str, Dict[str, Any]]:
+        """Poll until the batch completes; returns the sub-results by request id."""
+        deadline = time.monotonic() + timeout
+        while True:
+            result = await self.get_result(ticket)
+            if result.get("status") == "COMPLETED":
+                return {request["id"]: request for request in result.get("requests", [])}
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Ecwid batch {ticket} not completed after {timeout}s")
+            await asyncio.sleep(poll_interval)
+
+
+class ZohoItemsClient(ItemsClient):
+    async def get_item_details(self, item_ids: Iterable[str]) -> Dict[str, Any]:
+        """Items with per-warehouse stock; Zoho accepts a comma-separated id list."""
+        return await self._client.get("v1/itemdetails", params={"item_ids": ",".join(item_ids)})
+
+
+class PooledEcwidApi(EcwidApi):
+    def __init__(self, store_id: str, secret_token: str):
+        client = PooledEcwidHTTPClient(EcwidAuth(store_id, secret_token))
+
+        self.products_client = EcwidProductsClient(client)
+        self.orders_client = OrdersClient(client)
+        self.batch_client = EcwidBatchClient(client)
+
+
+class PooledZohoApi(ZohoApi):
+    def __init__(
+        self,
+        access_token: str,
+        location: Location,
+        organization_id: str,
+        token_provider: Optional[TokenProvider] = None
+    ):
+        client = PooledZohoHTTPClient(AuthClient(access_token, location), organization_id, token_provider)
+
+        self.contacts_client = ContactsClient(client)
+        self.organizations_client = OrganizationsClient(client)
+        self.sales_orders_client = SalesOrdersClient(client)
+        self.items_client = ZohoItemsClient(client)
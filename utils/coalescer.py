@@ -0,0 +1,87 @@
+import asyncio
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from ecwid_api import EcwidApi
+
+StockAdjuster = Callable[[EcwidApi, int, int, int], Awaitable[Dict[str, Any]]]
+
+
+class _PendingDelta:
+    def __init__(self, ecwid_api: EcwidApi):
+        self.ecwid_api = ecwid_api
+        self.quantity = 0
+        self.waiters: List[asyncio.Future] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class StockDeltaCoalescer:
+    """Sums stock deltas per Ecwid product over a time window.
+
+    The first delta for a product opens a window; every delta submitted
+    before it closes is added to the same total and a single adjustment is
+    sent when the window ends. All submitters receive that adjustment's result.
+    """
+
+    def __init__(
+        self,
+        window: float,
+        adjust: StockAdjuster
+    ):
+        self.window = window
+        self._adjust = adjust
+        self._pending: Dict[Tuple[int, int], _PendingDelta] = {}
+        self._flushes: Set[asyncio.Task] = set()
+
+    async def submit(
+        self,
+        ecwid_api: EcwidApi,
+        store_id: int,
+        ecwid_item_id: int,
+        quantity: int
+    ) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        key = (store_id, ecwid_item_id)
+
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = _PendingDelta(ecwid_api)
+            pending.timer = loop.call_later(self.window, self._start_flush, key)
+
+        pending.quantity += quantity
+        waiter = loop.create_future()
+        pending.waiters.append(waiter)
+        # Shielded so that one cancelled submitter doesn't cancel the others' adjustment
+        return await asyncio.shield(waiter)
+
+    def _start_flush(self, key: Tuple[int, int]) -> None:
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+
+        task = asyncio.ensure_future(self._flush(key, pending))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, key: Tuple[int, int], pending: _PendingDelta) -> None:
+        store_id, ecwid_item_id = key
+        try:
+            if pending.quantity:
+                result = await self._adjust(pending.ecwid_api, store_id, ecwid_item_id, pending.quantity)
+            else:
+                result = {"status": "success", "attempts": 0}
+        except Exception as e:
+            result = {"status": "failed", "attempts": 1, "error": repr(e)}
+
+        result = {**result, "coalesced": len(pending.waiters)}
+        for waiter in pending.waiters:
+            if not waiter.done():
+                waiter.set_result(result)
+
+    async def drain(self) -> None:
+        """Flush every open window immediately and wait for the adjustments."""
+        for key, pending in list(self._pending.items()):
+            pending.timer.cancel()
+            self._start_flush(key)
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
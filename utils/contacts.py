@@ -0,0 +1,75 @@
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from zoho_api import ZohoApi
+
+from core import MISSING, SingleFlight, TTLCache, async_session_maker, settings
+from crud import ZohoContactsCRUD
+
+
+class ZohoContactResolver:
+    """Maps a customer email to a Zoho contact_id, creating the contact if needed.
+
+    Lookups go memory -> zoho_contacts -> Zoho API. Concurrent orders for the
+    same email share one lookup, so a new customer is only created once.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache: TTLCache[Tuple[int, str], str] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._flights: SingleFlight[Tuple[int, str], str] = SingleFlight()
+
+    async def resolve(
+        self,
+        zoho_api: ZohoApi,
+        store_id: int,
+        email: str,
+        build_contact: Callable[[], Dict[str, Any]]
+    ) -> str:
+        """`build_contact` is only called when the contact has to be created in Zoho."""
+        key = (store_id, email.strip().lower())
+        contact_id = self._cache.get(key)
+        if contact_id is not MISSING:
+            return contact_id
+
+        return await self._flights.do(key, lambda: self._lookup_or_create(zoho_api, key, build_contact))
+
+    def invalidate(self, store_id: int, email: str) -> None:
+        self._cache.invalidate((store_id, email.strip().lower()))
+
+    async def _lookup_or_create(
+        self,
+        zoho_api: ZohoApi,
+        key: Tuple[int, str],
+        build_contact: Callable[[], Dict[str, Any]]
+    ) -> str:
+        store_id, email = key
+        async with async_session_maker() as db:
+            contact = await ZohoContactsCRUD.find_one_or_none(db, store_id=store_id, email=email)
+        if contact:
+            self._cache.set(key, contact.contact_id)
+            return contact.contact_id
+
+        # No session is held across the Zoho round trips, they can take seconds
+        customers = (await zoho_api.contacts_client.list_contacts(email=email)).get('contacts', [])
+        if customers:
+            contact_id = str(customers[0]['contact_id'])
+        else:
+            customer = await zoho_api.contacts_client.create_contact(**build_contact())
+            contact_id = str(customer['contact']['contact_id'])
+        async with async_session_maker() as db:
+            await ZohoContactsCRUD.save(db, store_id, email, contact_id)
+
+        self._cache.set(key, contact_id)
+        return contact_id
+
+
+_contact_resolver: Optional[ZohoContactResolver] = None
+
+
+def get_contact_resolver() -> ZohoContactResolver:
+    global _contact_resolver
+    if _contact_resolver is None:
+        _contact_resolver = ZohoContactResolver(
+            maxsize=settings.cache_settings.contacts_cache_maxsize,
+            ttl=settings.cache_settings.contacts_cache_ttl,
+        )
+    return _contact_resolver
@@ -0,0 +1,65 @@
+import hashlib
+import time
+
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import MISSING, TTLCache, settings
+from crud import ProcessedWebhooksCRUD
+
+
+def build_idempotency_key(source: str, event_id: Optional[str], body: bytes) -> str:
+    return f"{source}:{event_id or ''}:{hashlib.sha256(body).hexdigest()}"
+
+
+class IdempotencyGuard:
+    """Drops webhook deliveries that were already accepted.
+
+    Recent keys are answered from memory; everything else goes through an
+    INSERT ... ON CONFLICT on processed_webhooks, which also covers
+    duplicates delivered to other workers. The insert is made in the
+    caller's transaction (see utils.jobs.enqueue_job), so a key is only
+    claimed together with the job that processes it.
+    """
+
+    def __init__(self, ttl: float, maxsize: int, purge_interval: float):
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._seen: TTLCache[str, bool] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._last_purge = time.monotonic()
+        self.skipped = 0
+
+    async def claim(self, db: AsyncSession, key: str) -> bool:
+        """Claim `key` in `db`'s transaction; the caller commits and then calls accepted()."""
+        if self._seen.get(key) is not MISSING:
+            self.skipped += 1
+            return False
+
+        if time.monotonic() - self._last_purge > self.purge_interval:
+            self._last_purge = time.monotonic()
+            await ProcessedWebhooksCRUD.purge_expired(db)
+        claimed = await ProcessedWebhooksCRUD.claim(db, key, self.ttl, commit=False)
+        if not claimed:
+            self._seen.set(key, True)
+            self.skipped += 1
+        return claimed
+
+    def accepted(self, key: str) -> None:
+        """Remember a key whose claim was committed."""
+        self._seen.set(key, True)
+
+
+_idempotency_guard: Optional[IdempotencyGuard] = None
+
+
+def get_idempotency_guard() -> IdempotencyGuard:
+    global _idempotency_guard
+    if _idempotency_guard is None:
+        idempotency_settings = settings.idempotency_settings
+        _idempotency_guard = IdempotencyGuard(
+            ttl=idempotency_settings.idempotency_ttl,
+            maxsize=idempotency_settings.idempotency_cache_maxsize,
+            purge_interval=idempotency_settings.idempotency_purge_interval,
+        )
+    return _idempotency_guard
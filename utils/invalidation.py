@@ -0,0 +1,133 @@
+import asyncio
+import logging
+
+from typing import Any, Dict, Optional
+
+import orjson
+
+from core import settings
+from crud import ItemsCRUD
+from models import Items
+from .stores import get_store_registry
+from .tokens import zoho_token_cache
+
+# Must match the channel used by notify_cache_invalidation() (migration b7e2d94c1f36)
+CACHE_INVALIDATION_CHANNEL = "cache_invalidation"
+
+logger = logging.getLogger(__name__)
+
+
+def invalidate_all() -> None:
+    ItemsCRUD.invalidate_cache()
+    zoho_token_cache.invalidate()
+    get_store_registry().schedule_reload()
+
+
+def apply_invalidation(message: Dict[str, Any]) -> None:
+    """Drop what a committed change to items/stores/zoho_tokens made stale in this process."""
+    table = message.get("table")
+    rows = [row for row in (message.get("old"), message.get("new")) if row]
+
+    if table == "items":
+        if not rows:
+            ItemsCRUD.invalidate_cache()
+        for row in rows:
+            # Old and new keys: the negative cache entry for the new ones goes too
+            ItemsCRUD.invalidate_cache(Items(**row))
+    elif table == "stores":
+        get_store_registry().schedule_reload()
+    elif table == "zoho_tokens":
+        if not rows:
+            zoho_token_cache.invalidate()
+        for row in rows:
+            zoho_token_cache.invalidate(row["store_id"])
+
+
+class CacheInvalidationListener:
+    """Keeps the in-process caches of this worker in line with the database.
+
+    Listens on a dedicated connection (outside the pool, since it stays
+    checked out for good) to the notifications sent by the cache
+    invalidation triggers. Changes committed while the connection was down
+    can't be replayed, so every (re)connect starts from empty caches.
+    """
+
+    def __init__(self, heartbeat: float):
+        self.heartbeat = heartbeat
+        self._task: Optional[asyncio.Task] = None
+        self._connected = asyncio.Event()
+
+    async def _connect(self):
+        # Imported here so that importing the app doesn't load the driver (see core.database.get_engine)
+        import asyncpg
+
+        db_settings = settings.database_settings
+        return await asyncpg.connect(
+            host=db_settings.DB_DIRECT_HOST or db_settings.DB_HOST,
+            port=db_settings.DB_DIRECT_PORT or db_settings.DB_PORT,
+            user=db_settings.DB_USER,
+            password=db_settings.DB_PASS,
+            database=db_settings.DB_NAME,
+        )
+
+    def _on_notification(self, connection, pid, channel, payload) -> None:
+        try:
+            apply_invalidation(orjson.loads(payload))
+        except Exception:
+            logger.exception("Bad cache invalidation payload %r; dropping all caches", payload)
+            invalidate_all()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="cache-invalidation")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def wait_connected(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _run(self) -> None:
+        backoff = 1.0
+        while True:
+            connection = None
+            try:
+                connection = await self._connect()
+                await connection.add_listener(CACHE_INVALIDATION_CHANNEL, self._on_notification)
+                invalidate_all()
+                self._connected.set()
+                backoff = 1.0
+                # A dead TCP connection only shows up when something is sent over it
+                while True:
+                    await asyncio.sleep(self.heartbeat)
+                    await asyncio.wait_for(connection.execute("SELECT 1"), self.heartbeat)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._connected.clear()
+                logger.warning("Cache invalidation listener lost (%r), reconnecting in %.0fs", e, backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+            finally:
+                if connection is not None:
+                    connection.terminate()
+
+
+_cache_invalidation_listener: Optional[CacheInvalidationListener] = None
+
+
+def get_cache_invalidation_listener() -> CacheInvalidationListener:
+    global _cache_invalidation_listener
+    if _cache_invalidation_listener is None:
+        _cache_invalidation_listener = CacheInvalidationListener(
+            settings.cache_settings.cache_invalidation_heartbeat
+        )
+    return _cache_invalidation_listener
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from core import async_session_maker, settings
+from crud import JobsCRUD
+from models import Job
+from .idempotency import get_idempotency_guard
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+logger = logging.getLogger(__name__)
+
+_handlers: Dict[str, JobHandler] = {}
+
+_current_job: ContextVar[Optional[Job]] = ContextVar("current_job", default=None)
+
+
+def register_job_handler(kind: str, handler: JobHandler) -> None:
+    _handlers[kind] = handler
+
+
+async def enqueue_job(
+    kind: str,
+    payload: Dict[str, Any],
+    idempotency_key: Optional[str] = None
+) -> Optional[Job]:
+    """Insert a job; with `idempotency_key`, only if the key wasn't claimed before (None then).
+
+    The key and the job are committed together, so a crash can't leave a
+    claimed key without the job that processes it.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"No handler registered for job kind {kind!r}")
+
+    guard = get_idempotency_guard() if idempotency_key is not None else None
+    async with async_session_maker() as db:
+        if guard is not None and not await guard.claim(db, idempotency_key):
+            return None
+        job = await JobsCRUD.enqueue(db, kind, payload, commit=False)
+        await db.commit()
+
+    if guard is not None:
+        guard.accepted(idempotency_key)
+    if _worker_pool is not None:
+        _worker_pool.wake()
+    return job
+
+
+def get_job_progress() -> Dict[str, Any]:
+    """What earlier attempts of the running job saved; empty outside of a job."""
+    job = _current_job.get()
+    return dict(job.progress or {}) if job is not None else {}
+
+
+async def save_job_progress(progress: Dict[str, Any]) -> None:
+    """Persist the running job's progress straight away, so that a retry can skip what is done.
+
+    Side effects that must not be repeated are recorded before they are
+    made: a crash in between then skips them rather than applying them twice.
+    Outside of a job (scripts) this does nothing.
+    """
+    job = _current_job.get()
+    if job is None:
+        return
+    async with async_session_maker() as db:
+        await JobsCRUD.save_progress(db, job, progress)
+    job.progress = progress
+
+
+class JobWorkerPool:
+    def __init__(
+        self,
+        concurrency: int,
+        poll_interval: float,
+        heartbeat_interval: float,
+        shutdown_grace: float
+    ):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.shutdown_grace = shutdown_grace
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._workers: List[asyncio.Task] = []
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._running: Set[int] = set()
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def start(self) -> None:
+        self._stopping = False
+        self._workers = [
+            asyncio.create_task(self._work(), name=f"job-worker-{n}")
+            for n in range(self.concurrency)
+        ]
+        self._heartbeat = asyncio.create_task(self._beat(), name="job-heartbeat")
+
+    async def stop(self) -> None:
+        """Stop claiming and let in-flight jobs finish, cancelling them after the grace period."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._workers:
+            _, pending = await asyncio.wait(self._workers, timeout=self.shutdown_grace)
+            if pending:
+                # Their jobs stay `running` and are reclaimed after the visibility timeout
+                logger.warning("Cancelling %d jobs still running after %.0fs", len(self._running), self.shutdown_grace)
+                for worker in pending:
+                    worker.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        self._workers = []
+
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            self._heartbeat = None
+
+    async def _beat(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if not self._running:
+                continue
+            try:
+                async with async_session_maker() as db:
+                    await JobsCRUD.heartbeat(db, list(self._running))
+            except Exception:
+                logger.exception("Failed to refresh the locks of jobs %s", sorted(self._running))
+
+    async def _work(self) -> None:
+        while not self._stopping:
+            try:
+                async with async_session_maker() as db:
+                    jobs = await JobsCRUD.claim(db)
+            except Exception:
+                logger.exception("Failed to claim jobs")
+                jobs = []
+
+            if not jobs:
+                self._wakeup.clear()
+                if self._stopping:
+                    return
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            for job in jobs:
+                await self._run(job)
+
+    async def _run(self, job: Job) -> None:
+        handler = _handlers.get(job.kind)
+        self._running.add(job.id)
+        token = _current_job.set(job)
+        try:
+            try:
+                if handler is None:
+                    raise LookupError(f"No handler registered for job kind {job.kind!r}")
+                await handler(job.payload)
+            except Exception as e:
+                logger.exception("Job %s (%s) failed on attempt %d", job.id, job.kind, job.attempts)
+                async with async_session_maker() as db:
+                    await JobsCRUD.fail(db, job, repr(e))
+                return
+
+            async with async_session_maker() as db:
+                await JobsCRUD.complete(db, job)
+        finally:
+            _current_job.reset(token)
+            self._running.discard(job.id)
+
+
+_worker_pool: Optional[JobWorkerPool] = None
+
+
+async def start_job_workers() -> None:
+    global _worker_pool
+    if _worker_pool is not None:
+        return
+
+    jobs_settings = settings.jobs_settings
+    _worker_pool = JobWorkerPool(
+        jobs_settings.jobs_concurrency,
+        jobs_settings.jobs_poll_interval,
+        heartbeat_interval=jobs_settings.jobs_visibility_timeout / 3,
+        shutdown_grace=jobs_settings.jobs_shutdown_grace
+    )
+    _worker_pool.start()
+
+
+async def stop_job_workers() -> None:
+    global _worker_pool
+    if _worker_pool is None:
+        return
+
+    await _worker_pool.stop()
+    _worker_pool = None
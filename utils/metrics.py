@@ -0,0 +1,160 @@
+"""Prometheus metrics.
+
+When PROMETHEUS_MULTIPROC_DIR is set (several uvicorn workers), every process
+writes its samples to that directory and /metrics aggregates them, so any
+worker can answer the scrape. The directory must be emptied before start-up.
+"""
+import os
+import re
+import time
+
+from typing import Dict, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.database import TimedQueuePool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+WEBHOOK_ACK_SECONDS = Histogram(
+    "webhook_ack_seconds",
+    "Time to acknowledge an incoming webhook",
+    ["source", "type", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+WEBHOOK_PROCESSING_SECONDS = Histogram(
+    "webhook_processing_seconds",
+    "Time to process a queued webhook",
+    ["source", "type", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_REQUEST_SECONDS = Histogram(
+    "upstream_request_seconds",
+    "Outbound request latency per upstream endpoint",
+    ["upstream", "method", "endpoint", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds",
+    "Database statement execution time",
+    ["operation"],
+    buckets=DB_BUCKETS,
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting for a pooled database connection",
+    buckets=DB_BUCKETS,
+)
+JOB_QUEUE_DEPTH = Gauge(
+    "job_queue_depth",
+    "Jobs in the queue by status",
+    ["status"],
+    multiprocess_mode="livemostrecent",
+)
+AUDIT_QUEUE_DEPTH = Gauge(
+    "audit_queue_depth",
+    "Audit records waiting to be written",
+    multiprocess_mode="livesum",
+)
+AUDIT_FLUSH_SECONDS = Histogram(
+    "audit_flush_seconds",
+    "Time to COPY one batch of audit records",
+    ["outcome"],
+    buckets=DB_BUCKETS,
+)
+AUDIT_ROWS = Counter(
+    "audit_rows",
+    "Audit rows written",
+    ["table"],
+)
+AUDIT_DROPPED = Counter(
+    "audit_dropped_records",
+    "Audit records given up on after repeated flush failures",
+)
+ZOHO_TOKEN_REFRESHES = Counter(
+    "zoho_token_refreshes",
+    "Zoho access token refreshes",
+    ["outcome"],
+)
+
+# Any segment with a digit is an id, except API versions like `v1`
+_ID_SEGMENT = re.compile(r"^(?!v\d+$)[^/]*\d[^/]*$")
+_DB_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+_endpoint_templates: Dict[Tuple[str, str], str] = {}
+
+
+def endpoint_template(upstream: str, endpoint: str) -> str:
+    """Replace id-like path segments so `/products/123/inventory` becomes `/products/{id}/inventory`."""
+    template = _endpoint_templates.get((upstream, endpoint))
+    if template is None:
+        template = "/".join(
+            "{id}" if _ID_SEGMENT.match(segment) else segment
+            for segment in endpoint.split("?", 1)[0].split("/")
+        )
+        # Bounded: only a few endpoints exist, the raw strings are what grows
+        if len(_endpoint_templates) < 10000:
+            _endpoint_templates[(upstream, endpoint)] = template
+    return template
+
+
+def observe_upstream_request(upstream: str, method: str, endpoint: str, status: str, started: float) -> None:
+    UPSTREAM_REQUEST_SECONDS.labels(
+        upstream, method, endpoint_template(upstream, endpoint), status
+    ).observe(time.perf_counter() - started)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = conn.info["query_started"].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+    DB_QUERY_SECONDS.labels(operation if operation in _DB_OPERATIONS else "OTHER").observe(
+        time.perf_counter() - started
+    )
+
+
+def _handle_error(exception_context) -> None:
+    # after_cursor_execute doesn't fire for failed statements
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    sync_engine = engine.sync_engine
+    if isinstance(sync_engine.pool, TimedQueuePool):
+        sync_engine.pool.observe_wait = DB_POOL_CHECKOUT_SECONDS.observe
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+def mark_worker_dead() -> None:
+    """Drop this worker's live gauges from the multiprocess aggregate."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
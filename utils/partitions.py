@@ -0,0 +1,95 @@
+import asyncio
+import logging
+
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional
+
+from core import async_session_maker, settings
+from crud import WebhookPartitionsCRUD
+
+logger = logging.getLogger(__name__)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+async def maintain_webhook_partitions(now: Optional[datetime] = None) -> Dict[str, List[str]]:
+    """Create upcoming monthly partitions and drop or archive expired ones.
+
+    Expired months go away with DROP/DETACH of whole partitions, which is
+    instant and leaves nothing for vacuum, unlike a DELETE of old rows.
+    """
+    log_settings = settings.webhook_log_settings
+    current = (now or datetime.now(timezone.utc)).date().replace(day=1)
+    wanted = [_add_months(current, n) for n in range(log_settings.webhook_log_partitions_ahead + 1)]
+
+    created, skipped, expired = [], [], []
+    async with async_session_maker() as db:
+        await WebhookPartitionsCRUD.lock(db)
+        existing = set(await WebhookPartitionsCRUD.find_months(db))
+
+        for month in wanted:
+            if month in existing:
+                continue
+            if await WebhookPartitionsCRUD.create_month(db, month):
+                created.append(f"{month:%Y-%m}")
+            else:
+                skipped.append(f"{month:%Y-%m}")
+
+        if log_settings.webhook_log_retention_months:
+            cutoff = _add_months(current, -log_settings.webhook_log_retention_months)
+            for month in sorted(existing):
+                if month >= cutoff:
+                    break
+                await WebhookPartitionsCRUD.drop_month(db, month, archive=log_settings.webhook_log_archive)
+                expired.append(f"{month:%Y-%m}")
+
+        await db.commit()
+
+    if skipped:
+        logger.warning("Webhook log months %s already have rows in the default partition; not partitioned", skipped)
+    if created or expired:
+        logger.info(
+            "Webhook log partitions: created %s, %s %s",
+            created, "archived" if log_settings.webhook_log_archive else "dropped", expired
+        )
+    return {"created": created, "skipped": skipped, "expired": expired}
+
+
+class PartitionMaintainer:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="partition-maintainer")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await maintain_webhook_partitions()
+            except Exception:
+                # Rows still land in the default partition meanwhile
+                logger.exception("Webhook log partition maintenance failed")
+            await asyncio.sleep(self.interval)
+
+
+_partition_maintainer: Optional[PartitionMaintainer] = None
+
+
+def get_partition_maintainer() -> PartitionMaintainer:
+    global _partition_maintainer
+    if _partition_maintainer is None:
+        _partition_maintainer = PartitionMaintainer(
+            settings.webhook_log_settings.webhook_log_maintenance_interval
+        )
+    return _partition_maintainer
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import sys
+import threading
+
+from collections import Counter
+from types import FrameType
+from typing import Optional
+
+from core import settings
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+class SamplingProfiler:
+    """Samples the stacks of all other threads from a background thread.
+
+    The output is in the folded format (`frame;frame;frame count` per line)
+    that flamegraph.pl and speedscope read directly. Coroutines show up under
+    the event loop thread, since a running coroutine's frames are on its stack.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def profile(self, seconds: float) -> str:
+        if self._lock.locked():
+            raise ProfilerBusyError("A profile is already being collected")
+
+        async with self._lock:
+            stacks: Counter = Counter()
+            stop = threading.Event()
+            sampler = threading.Thread(
+                target=self._sample,
+                args=(stacks, stop),
+                name="sampling-profiler",
+                daemon=True
+            )
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                stop.set()
+                await asyncio.to_thread(sampler.join)
+
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+    def _sample(self, stacks: Counter, stop: threading.Event) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stacks[self._fold(names.get(thread_id, str(thread_id)), frame)] += 1
+
+    @staticmethod
+    def _fold(thread_name: str, frame: Optional[FrameType]) -> str:
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        frames.append(thread_name)
+        return ";".join(reversed(frames))
+
+
+_profiler: Optional[SamplingProfiler] = None
+
+
+def get_profiler() -> SamplingProfiler:
+    global _profiler
+    if _profiler is None:
+        _profiler = SamplingProfiler(settings.diagnostics_settings.profiler_interval_ms / 1000)
+    return _profiler
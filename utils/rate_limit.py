@@ -0,0 +1,156 @@
+import asyncio
+import time
+
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import httpx
+
+from core import settings
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.rate = rate
+        # A quota split between workers can leave less than one token, which no acquire() could take;
+        # the rate still holds the long-run average to the quota
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self._clock = clock
+        self._updated = clock()
+        self._blocked_until = 0.0
+        # Waiters are served in arrival order
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = self._clock()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for `seconds`, e.g. after a 429 with Retry-After."""
+        now = self._clock()
+        self._refill(now)
+        self.tokens = 0
+        self._blocked_until = max(self._blocked_until, now + seconds)
+
+    def sync(self, remaining: int, reset_in: Optional[float]) -> None:
+        """Align the local bucket with the quota the upstream reports."""
+        self._refill(self._clock())
+        self.tokens = min(self.tokens, remaining)
+        if remaining <= 0 and reset_in:
+            self.pause(reset_in)
+
+    def snapshot(self) -> Dict[str, float]:
+        now = self._clock()
+        self._refill(now)
+        return {
+            "tokens": round(self.tokens, 2),
+            "capacity": self.capacity,
+            "rate_per_second": self.rate,
+            "blocked_for": round(max(self._blocked_until - now, 0.0), 2),
+        }
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _first_header(response: httpx.Response, *names: str) -> Optional[str]:
+    for name in names:
+        value = response.headers.get(name)
+        if value is not None:
+            return value
+    return None
+
+
+class RateLimiter:
+    """Token buckets per (upstream, key), where key identifies the store or organization."""
+
+    def __init__(self):
+        self._buckets: Dict[Tuple[str, Hashable], List[TokenBucket]] = {}
+
+    def _build_buckets(self, upstream: str) -> List[TokenBucket]:
+        rate_limit_settings = settings.rate_limit_settings
+        if upstream == "ecwid":
+            per_minute, per_day = rate_limit_settings.ecwid_requests_per_minute, 0
+        else:
+            per_minute, per_day = (
+                rate_limit_settings.zoho_requests_per_minute,
+                rate_limit_settings.zoho_requests_per_day
+            )
+
+        # Every worker process has its own buckets, so each gets an equal share of the quota
+        workers = max(settings.server_settings.server_workers, 1)
+        per_minute, per_day = per_minute / workers, per_day / workers
+
+        buckets = [TokenBucket(per_minute / 60, per_minute)]
+        if per_day:
+            buckets.append(TokenBucket(per_day / 86400, per_day))
+        return buckets
+
+    def _get_buckets(self, upstream: str, key: Hashable) -> List[TokenBucket]:
+        buckets = self._buckets.get((upstream, key))
+        if buckets is None:
+            buckets = self._buckets[(upstream, key)] = self._build_buckets(upstream)
+        return buckets
+
+    async def acquire(self, upstream: str, key: Hashable) -> None:
+        for bucket in self._get_buckets(upstream, key):
+            await bucket.acquire()
+
+    def observe(self, upstream: str, key: Hashable, response: httpx.Response) -> Optional[float]:
+        """Feed rate-limit headers back into the buckets.
+
+        Returns the delay to wait before retrying when the response is a 429.
+        """
+        minute_bucket = self._get_buckets(upstream, key)[0]
+
+        remaining = _first_header(response, "x-ratelimit-remaining", "x-rate-limit-remaining")
+        reset = _first_header(response, "x-ratelimit-reset", "x-rate-limit-reset")
+        if remaining is not None and remaining.isdigit():
+            minute_bucket.sync(int(remaining), _parse_retry_after(reset))
+
+        if response.status_code != 429:
+            return None
+
+        delay = _parse_retry_after(response.headers.get("retry-after"))
+        if delay is None:
+            delay = _parse_retry_after(reset) or settings.rate_limit_settings.rate_limit_default_retry_after
+        minute_bucket.pause(delay)
+        return delay
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            f"{upstream}:{key}": [bucket.snapshot() for bucket in buckets]
+            for (upstream, key), buckets in self._buckets.items()
+        }
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+
+from typing import Any, Dict, List, Optional
+
+from ecwid_api import EcwidApi
+from zoho_api import ZohoApi
+
+from core import async_session_maker, settings
+from crud import ItemsCRUD
+from models import Items, Stores
+
+ECWID_PAGE_SIZE = 100
+# Zoho field order of preference for the warehouse quantity Ecwid should show
+ZOHO_STOCK_FIELDS = (
+    "warehouse_available_for_sale_stock",
+    "warehouse_available_stock",
+    "warehouse_stock_on_hand",
+)
+MAX_REPORTED_MISMATCHES = 100
+
+logger = logging.getLogger(__name__)
+
+
+class ReconciliationReport:
+    def __init__(self, store_id: int, apply: bool):
+        self.store_id = store_id
+        self.apply = apply
+        self.checked = 0
+        self.matched = 0
+        self.missing_in_zoho = 0
+        self.missing_in_ecwid = 0
+        self.unlimited = 0
+        self.mismatched = 0
+        self.pushed = 0
+        self.failed = 0
+        # Only a sample is kept, the counters cover the whole catalog
+        self.mismatches: List[Dict[str, Any]] = []
+
+    def add_mismatch(self, mismatch: Dict[str, Any]) -> None:
+        self.mismatched += 1
+        if len(self.mismatches) < MAX_REPORTED_MISMATCHES:
+            self.mismatches.append(mismatch)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+def _zoho_warehouse_stock(item: Dict[str, Any]) -> Optional[int]:
+    target_warehouse_id = settings.zoho_settings.zoho_warehouse_id
+    for warehouse in item.get('warehouses', []):
+        if str(warehouse.get('warehouse_id')) != target_warehouse_id:
+            continue
+        for field in ZOHO_STOCK_FIELDS:
+            if warehouse.get(field) is not None:
+                return int(warehouse[field])
+    return None
+
+
+async def fetch_zoho_stock(zoho_api: ZohoApi, zoho_item_ids: List[str]) -> Dict[str, int]:
+    response = await zoho_api.items_client.get_item_details(zoho_item_ids)
+    stock = {}
+    for item in response.get('items', []):
+        quantity = _zoho_warehouse_stock(item)
+        if quantity is not None:
+            stock[str(item.get('item_id'))] = quantity
+    return stock
+
+
+async def fetch_ecwid_stock(ecwid_api: EcwidApi, ecwid_item_ids: List[int]) -> Dict[int, Optional[int]]:
+    """Ecwid quantities by product id; None means the product has unlimited stock."""
+    stock: Dict[int, Optional[int]] = {}
+    for start in range(0, len(ecwid_item_ids), ECWID_PAGE_SIZE):
+        page = ecwid_item_ids[start:start + ECWID_PAGE_SIZE]
+        response = await ecwid_api.products_client.search_products(
+            productId=",".join(map(str, page)),
+            limit=ECWID_PAGE_SIZE,
+            responseFields="items(id,quantity,unlimited)",
+        )
+        for product in response.get('items', []):
+            stock[product['id']] = None if product.get('unlimited') else int(product.get('quantity') or 0)
+    return stock
+
+
+async def _push_quantity(
+    ecwid_api: EcwidApi,
+    semaphore: asyncio.Semaphore,
+    mismatch: Dict[str, Any]
+) -> bool:
+    try:
+        async with semaphore:
+            # Absolute quantity rather than a delta: re-running a reconciliation is harmless
+            await ecwid_api.products_client.update_product(
+                mismatch["ecwid_item_id"],
+                {"quantity": mismatch["zoho_quantity"]}
+            )
+        return True
+    except Exception as e:
+        logger.error("Reconciliation: failed to set ecwid item %s stock: %r", mismatch["ecwid_item_id"], e)
+        return False
+
+
+async def _reconcile_chunk(
+    chunk: List[Items],
+    ecwid_api: EcwidApi,
+    zoho_api: ZohoApi,
+    semaphore: asyncio.Semaphore,
+    report: ReconciliationReport
+) -> None:
+    zoho_stock, ecwid_stock = await asyncio.gather(
+        fetch_zoho_stock(zoho_api, [item.zoho_item_id for item in chunk]),
+        fetch_ecwid_stock(ecwid_api, [item.ecwid_item_id for item in chunk]),
+    )
+
+    mismatches = []
+    for item in chunk:
+        report.checked += 1
+        if item.zoho_item_id not in zoho_stock:
+            report.missing_in_zoho += 1
+            continue
+        if item.ecwid_item_id not in ecwid_stock:
+            report.missing_in_ecwid += 1
+            continue
+
+        ecwid_quantity = ecwid_stock[item.ecwid_item_id]
+        if ecwid_quantity is None:
+            report.unlimited += 1
+            continue
+
+        zoho_quantity = zoho_stock[item.zoho_item_id]
+        if zoho_quantity == ecwid_quantity:
+            report.matched += 1
+            continue
+
+        mismatch = {
+            "zoho_item_id": item.zoho_item_id,
+            "ecwid_item_id": item.ecwid_item_id,
+            "zoho_quantity": zoho_quantity,
+            "ecwid_quantity": ecwid_quantity,
+        }
+        report.add_mismatch(mismatch)
+        mismatches.append(mismatch)
+
+    if report.apply and mismatches:
+        pushed = await asyncio.gather(*(
+            _push_quantity(ecwid_api, semaphore, mismatch)
+            for mismatch in mismatches
+        ))
+        report.pushed += sum(pushed)
+        report.failed += len(pushed) - sum(pushed)
+
+
+async def reconcile_store(
+    store: Stores,
+    ecwid_api: EcwidApi,
+    zoho_api: ZohoApi,
+    apply: bool = False,
+    chunk_size: Optional[int] = None,
+    concurrency: Optional[int] = None
+) -> ReconciliationReport:
+    """Compare Zoho warehouse stock with Ecwid quantities for every mapped item.
+
+    Items are streamed `chunk_size` at a time and each chunk is fetched from
+    both sides, diffed and (with `apply`) corrected before the next one is
+    read, so memory stays flat however large the catalog is. Both default
+    to the RECONCILE_* settings.
+    """
+    reconciliation_settings = settings.reconciliation_settings
+    chunk_size = chunk_size or reconciliation_settings.reconcile_chunk_size
+    concurrency = concurrency or reconciliation_settings.reconcile_concurrency
+    report = ReconciliationReport(store.id, apply)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with async_session_maker() as db:
+        async for chunk in ItemsCRUD.iter_chunks(db, store.id, chunk_size):
+            await _reconcile_chunk(chunk, ecwid_api, zoho_api, semaphore, report)
+
+    logger.info(
+        "Reconciliation for store %s (%s): checked %d, mismatched %d, pushed %d, failed %d",
+        store.id, "apply" if apply else "dry-run",
+        report.checked, report.mismatched, report.pushed, report.failed
+    )
+    return report
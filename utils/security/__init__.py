@@ -3,19 +3,21 @@ from .auth import (
     generate_zoho_tokens_url
 )
 from .validators import (
-    ZohoInventoryWebhookValidator,
-    ZohoPurchaseWebhookValidator,
-    ZohoSalesWebhookValidator,
-    ZohoTransferWebhookValidator,
-    WebhookValidatorProtocol
+    ZOHO_WEBHOOK_SECRETS,
+    WebhookValidator,
+    decode_json_body,
+    get_zoho_webhook_validator,
+    verify_admin_token,
+    verify_zoho_webhook
 )
 
 __all__ = [
-    "ZohoInventoryWebhookValidator",
-    "ZohoPurchaseWebhookValidator",
-    "ZohoSalesWebhookValidator",
-    "ZohoTransferWebhookValidator",
-    "WebhookValidatorProtocol",
+    "ZOHO_WEBHOOK_SECRETS",
+    "WebhookValidator",
+    "decode_json_body",
+    "get_zoho_webhook_validator",
+    "verify_admin_token",
+    "verify_zoho_webhook",
     "generate_zoho_auth_uri",
     "generate_zoho_tokens_url"
 ]
\ No newline at end of file
@@ -1,65 +1,101 @@
 import hmac
 import hashlib
+import time
 
-from typing import ClassVar, Protocol
+from typing import Any, Dict, Optional, Tuple
+
+import orjson
 
 from fastapi import (
+    Header,
     HTTPException,
+    Path,
     Request
 )
 from core.config import settings
+from ..metrics import WEBHOOK_ACK_SECONDS
 
-class WebhookValidatorProtocol(Protocol):
-    secret_key: ClassVar[str]
-
-    @classmethod
-    async def validate(
-        cls,
-        request: Request
-    ) -> bool: ...
-
-class BaseValidator:
-    secret_key: ClassVar[str] = ""
-
-    @staticmethod
-    async def _get_payload(request: Request) -> bytes:
-        return await request.body() 
 
-    @staticmethod
-    async def _get_zoho_signature(request: Request) -> str:
-        return request.headers.get('x-zoho-webhook-signature')
+class WebhookValidator:
+    def __init__(self, secret_key: str):
+        if not secret_key:
+            raise ValueError("secret_key must not be empty")
+        # Keyed once; every request works on a copy, so the key schedule isn't redone per call
+        self._hmac = hmac.new(secret_key.encode('utf-8'), digestmod=hashlib.sha256)
 
-    @classmethod
-    async def validate(
-        cls,
-        request: Request
+    def verify(
+        self,
+        payload: bytes,
+        received_signature: Optional[str]
     ) -> bool:
-        received_signature = await cls._get_zoho_signature(request)
-        payload = await cls._get_payload(request)
-        if not cls.secret_key:
-            raise NotImplementedError(f"{cls.__name__}: secret_key must be set in child class!")
-        
         if not received_signature:
             raise HTTPException(status_code=400, detail="Missing signature header")
 
-        computed_signature = hmac.new(
-            cls.secret_key.encode('utf-8'),
-            msg=payload,
-            digestmod=hashlib.sha256
-        ).hexdigest()
+        computed = self._hmac.copy()
+        computed.update(payload)
+        return hmac.compare_digest(computed.hexdigest(), received_signature)
+
+
+# Webhook type -> ZohoSettings field holding its signing secret
+ZOHO_WEBHOOK_SECRETS: Dict[str, str] = {
+    "inventory-adjustment": "zoho_inventory_adjustment_secret",
+    "sales": "zoho_fbm_sales_secret",
+    "purchase": "zoho_purchase_secret",
+    "transfer": "zoho_transfer_secret",
+}
+
+_zoho_webhook_validators: Dict[str, WebhookValidator] = {}
+
+
+def get_zoho_webhook_validator(webhook_type: str) -> Optional[WebhookValidator]:
+    """The validator for a webhook type, keyed on first use; None for unknown types."""
+    validator = _zoho_webhook_validators.get(webhook_type)
+    if validator is None and webhook_type in ZOHO_WEBHOOK_SECRETS:
+        secret = getattr(settings.zoho_settings, ZOHO_WEBHOOK_SECRETS[webhook_type])
+        validator = _zoho_webhook_validators[webhook_type] = WebhookValidator(secret)
+    return validator
+
+
+def decode_json_body(body: bytes) -> Any:
+    try:
+        return orjson.loads(body)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+
+
+async def verify_zoho_webhook(
+    request: Request,
+    webhook_type: str = Path(...),
+) -> Tuple[bytes, Dict[str, Any]]:
+    """Read the body once, check its signature and decode it.
+
+    Returns the raw body together with the decoded payload.
+    """
+    started = time.perf_counter()
+    validator = get_zoho_webhook_validator(webhook_type)
+    if validator is None:
+        WEBHOOK_ACK_SECONDS.labels("zoho", "unknown", "rejected").observe(time.perf_counter() - started)
+        raise HTTPException(status_code=400, detail="Unknown webhook type")
+
+    body = await request.body()
+    try:
+        if not validator.verify(body, request.headers.get('x-zoho-webhook-signature')):
+            raise HTTPException(status_code=403, detail="Invalid signature")
+    except HTTPException:
+        WEBHOOK_ACK_SECONDS.labels("zoho", webhook_type, "rejected").observe(time.perf_counter() - started)
+        raise
 
-        return hmac.compare_digest(computed_signature, received_signature)
-    
-    
-class ZohoInventoryWebhookValidator(BaseValidator):
-    secret_key = settings.zoho_settings.zoho_inventory_adjustment_secret
+    return body, decode_json_body(body)
 
-class ZohoSalesWebhookValidator(BaseValidator):
-    secret_key = settings.zoho_settings.zoho_fbm_sales_secret
 
-class ZohoPurchaseWebhookValidator(BaseValidator):
-    secret_key = settings.zoho_settings.zoho_purchase_secret
+def verify_admin_token(
+    authorization: Optional[str] = Header(None),
+) -> None:
+    admin_token = settings.diagnostics_settings.admin_token
+    # Without a configured token the admin endpoints don't exist
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
 
-class ZohoTransferWebhookValidator(BaseValidator):
-    secret_key = settings.zoho_settings.zoho_transfer_secret 
-    
\ No newline at end of file
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), admin_token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
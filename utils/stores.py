@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from core import SingleFlight, async_session_maker, settings
+from crud import StoresCRUD
+from models import Stores
+from .clients import PooledEcwidApi, PooledZohoApi
+from .tokens import zoho_token_cache
+
+logger = logging.getLogger(__name__)
+
+
+def _store_key(store: Stores) -> Tuple[Hashable, ...]:
+    # The columns the clients are built from
+    return (store.id, store.zoho_organization_id, store.ecwid_store_id, store.location)
+
+
+class StoreClients:
+    """A store row with the Ecwid and Zoho clients built for it."""
+
+    __slots__ = ("store", "key", "ecwid_api", "zoho_api")
+
+    def __init__(self, store: Stores):
+        store_id = store.id
+        self.store = store
+        self.key = _store_key(store)
+        self.ecwid_api = PooledEcwidApi(store.ecwid_store_id, settings.ecwid_settings.ecwid_app_secret)
+        # The token is fetched from the cache before every request, so the client can live forever
+        self.zoho_api = PooledZohoApi(
+            "",
+            store.location,
+            store.zoho_organization_id,
+            token_provider=lambda: zoho_token_cache.get_access_token(store_id)
+        )
+
+
+class StoreRegistry:
+    """Long-lived API clients per `stores` row, looked up by Zoho organization or Ecwid store.
+
+    Rows are loaded on start and every `refresh_interval` seconds; entries
+    whose row didn't change keep their clients. A lookup for an unknown store
+    reloads straight away (at most once per `miss_reload_interval`), so a new
+    row is picked up by its first webhook.
+    """
+
+    def __init__(self, refresh_interval: float, miss_reload_interval: float):
+        self.refresh_interval = refresh_interval
+        self.miss_reload_interval = miss_reload_interval
+        # ("zoho", zoho_organization_id) and ("ecwid", ecwid_store_id) -> clients
+        self._index: Dict[Tuple[str, Hashable], StoreClients] = {}
+        self._loads: SingleFlight[str, None] = SingleFlight()
+        self._loaded_at = 0.0
+        # Bumped when the rows are known to have changed, see _load
+        self._generation = 0
+        self._task: Optional[asyncio.Task] = None
+        self._background: Set[asyncio.Task] = set()
+
+    def all(self) -> List[StoreClients]:
+        unique = {clients.store.id: clients for clients in self._index.values()}
+        return [unique[store_id] for store_id in sorted(unique)]
+
+    async def by_zoho_organization(self, zoho_organization_id: Optional[str]) -> StoreClients:
+        return await self._lookup(("zoho", zoho_organization_id))
+
+    async def by_ecwid_store(self, ecwid_store_id: Optional[int]) -> StoreClients:
+        try:
+            ecwid_store_id = int(ecwid_store_id)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=404, detail="Store not found")
+        return await self._lookup(("ecwid", ecwid_store_id))
+
+    async def _lookup(self, key: Tuple[str, Hashable]) -> StoreClients:
+        clients = self._index.get(key)
+        if clients is None and time.monotonic() - self._loaded_at >= self.miss_reload_interval:
+            await self.reload()
+            clients = self._index.get(key)
+        if clients is None:
+            raise HTTPException(status_code=404, detail="Store not found")
+        return clients
+
+    async def reload(self) -> None:
+        await self._loads.do("stores", self._load)
+
+    def schedule_reload(self) -> None:
+        """Reload in the background, for callers that can't wait (notification callbacks).
+
+        A load already in flight may have read the rows before the change was
+        committed, so it reads them again instead of being joined as is.
+        """
+        self._generation += 1
+        task = asyncio.create_task(self._reload_in_background())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _reload_in_background(self) -> None:
+        try:
+            await self.reload()
+        except Exception:
+            logger.exception("Store registry reload failed")
+
+    async def _load(self) -> None:
+        while True:
+            generation = self._generation
+            async with async_session_maker() as db:
+                stores = await StoresCRUD.find_all(db)
+            if generation == self._generation:
+                break
+
+        current = {clients.store.id: clients for clients in self._index.values()}
+        index = {}
+        for store in stores:
+            clients = current.get(store.id)
+            if clients is None or clients.key != _store_key(store):
+                clients = StoreClients(store)
+            index[("zoho", store.zoho_organization_id)] = clients
+            index[("ecwid", store.ecwid_store_id)] = clients
+
+        removed = current.keys() - {store.id for store in stores}
+        added = {store.id for store in stores} - current.keys()
+        # Swapped in whole, so a lookup never sees a half-built index
+        self._index = index
+        self._loaded_at = time.monotonic()
+        if added or removed:
+            logger.info("Store registry: %d stores, added %s, removed %s", len(stores), sorted(added), sorted(removed))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="store-registry")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reload()
+            except Exception:
+                # Lookups keep using the last loaded stores
+                logger.exception("Store registry refresh failed")
+            await asyncio.sleep(self.refresh_interval)
+
+
+_store_registry: Optional[StoreRegistry] = None
+
+
+def get_store_registry() -> StoreRegistry:
+    global _store_registry
+    if _store_registry is None:
+        _store_registry = StoreRegistry(
+            refresh_interval=settings.cache_settings.stores_refresh_interval,
+            miss_reload_interval=settings.cache_settings.stores_miss_reload_interval,
+        )
+    return _store_registry
@@ -0,0 +1,70 @@
+import time
+
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from core import SingleFlight, async_session_maker
+from crud import ZohoTokensCRUD
+from .clients import ZOHO_ACCOUNTS_POOL, get_http_pool
+from .metrics import ZOHO_TOKEN_REFRESHES
+from .security.auth import generate_zoho_refresh_url
+
+# Tokens this close to expiry are refreshed ahead of time
+REFRESH_MARGIN = 60
+
+
+class ZohoTokenCache:
+    def __init__(self):
+        # store_id -> (access_token, expires_at)
+        self._tokens: Dict[int, Tuple[str, int]] = {}
+        self._refreshes: SingleFlight[int, str] = SingleFlight()
+        self.refresh_count = 0
+
+    async def get_access_token(self, store_id: int) -> str:
+        cached = self._tokens.get(store_id)
+        if cached and cached[1] - REFRESH_MARGIN > time.time():
+            return cached[0]
+
+        return await self._refreshes.do(store_id, lambda: self._load_or_refresh(store_id))
+
+    def invalidate(self, store_id: Optional[int] = None) -> None:
+        if store_id is None:
+            self._tokens.clear()
+        else:
+            self._tokens.pop(store_id, None)
+
+    async def _load_or_refresh(self, store_id: int) -> str:
+        async with async_session_maker() as db:
+            tokens = await ZohoTokensCRUD.find_for_update(db, store_id)
+            if not tokens:
+                raise HTTPException(status_code=404, detail="Zoho tokens not found")
+
+            # Another worker may have refreshed while we waited for the row lock
+            if tokens.expires_in - REFRESH_MARGIN < time.time():
+                url = generate_zoho_refresh_url(tokens.refresh_token)
+                try:
+                    response = await get_http_pool(ZOHO_ACCOUNTS_POOL).post(url)
+                    response.raise_for_status()
+                except Exception:
+                    ZOHO_TOKEN_REFRESHES.labels("error").inc()
+                    raise
+                payload = response.json()
+                if 'access_token' not in payload:
+                    ZOHO_TOKEN_REFRESHES.labels("rejected").inc()
+                    raise HTTPException(status_code=502, detail=f"Zoho token refresh failed: {payload.get('error')}")
+
+                tokens = await ZohoTokensCRUD.patch_entity(
+                    db,
+                    tokens,
+                    access_token=payload['access_token'],
+                    expires_in=int(time.time() + payload.get('expires_in', 3600))
+                )
+                self.refresh_count += 1
+                ZOHO_TOKEN_REFRESHES.labels("success").inc()
+
+            self._tokens[store_id] = (tokens.access_token, tokens.expires_in)
+            return tokens.access_token
+
+
+zoho_token_cache = ZohoTokenCache()
@@ -0,0 +1,101 @@
+import logging
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, Iterator, List, Optional, TypeVar
+
+from core import settings
+
+T = TypeVar('T')
+
+logger = logging.getLogger(__name__)
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "end", "error", "children")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+        self.children: List["Span"] = []
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def render(self, root_start: Optional[float] = None, depth: int = 0) -> List[str]:
+        """One line per span: offset from the root, duration, name and attributes."""
+        root_start = self.start if root_start is None else root_start
+        attrs = " ".join(f"{key}={value}" for key, value in self.attrs.items())
+        line = (
+            f"{'  ' * depth}+{(self.start - root_start) * 1000:.1f}ms "
+            f"{self.duration * 1000:.1f}ms {self.name}"
+        )
+        if attrs:
+            line += f" {attrs}"
+        if self.error:
+            line += f" error={self.error}"
+
+        lines = [line]
+        for child in self.children:
+            lines.extend(child.render(root_start, depth + 1))
+        return lines
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    """Time a stage as a child of the current span.
+
+    Outside of a trace this does nothing, so handlers called from scripts
+    don't pay for it. Tasks started inside a span (asyncio.gather) inherit it
+    as their parent.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    current = Span(name, attrs)
+    parent.children.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+async def traced(name: str, awaitable: Awaitable[T], **attrs: Any) -> T:
+    with span(name, **attrs):
+        return await awaitable
+
+
+@contextmanager
+def trace(name: str, threshold: Optional[float] = None, **attrs: Any) -> Iterator[Span]:
+    """Start a root span; if it takes longer than `threshold` seconds the whole tree is logged.
+
+    The threshold defaults to SLOW_WEBHOOK_THRESHOLD_MS.
+    """
+    if threshold is None:
+        threshold = settings.diagnostics_settings.slow_webhook_threshold_ms / 1000
+    root = Span(name, attrs)
+    token = _current_span.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.error = type(e).__name__
+        raise
+    finally:
+        root.end = time.perf_counter()
+        _current_span.reset(token)
+        if root.duration >= threshold:
+            logger.warning("Slow %s (%.0f ms):\n%s", name, root.duration * 1000, "\n".join(root.render()))
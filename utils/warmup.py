@@ -0,0 +1,45 @@
+import logging
+import time
+
+from core import async_session_maker, get_engine, settings
+from crud import ItemsCRUD
+from .security import ZOHO_WEBHOOK_SECRETS, get_zoho_webhook_validator
+from .stores import get_store_registry
+
+logger = logging.getLogger(__name__)
+
+
+async def open_db_connections(count: int) -> None:
+    """Fill the pool up to `count` connections so the first webhooks don't pay for the connects."""
+    connections = []
+    try:
+        for _ in range(count):
+            connections.append(await get_engine().connect())
+    finally:
+        for connection in connections:
+            await connection.close()
+
+
+async def warm_up_worker() -> None:
+    """Per-process start-up: every uvicorn worker has its own clients, caches and pool."""
+    started = time.perf_counter()
+    store_registry = get_store_registry()
+    # Also surfaces a missing signing secret at start-up rather than on the first webhook
+    for webhook_type in ZOHO_WEBHOOK_SECRETS:
+        get_zoho_webhook_validator(webhook_type)
+    await open_db_connections(settings.database_settings.DB_POOL_SIZE)
+    await store_registry.reload()
+
+    # Each item takes two cache entries (by Zoho and by Ecwid id)
+    budget = settings.cache_settings.items_cache_maxsize // 2
+    primed = 0
+    async with async_session_maker() as db:
+        for clients in store_registry.all():
+            if primed >= budget:
+                break
+            primed += await ItemsCRUD.prime_cache(db, clients.store.id, budget - primed)
+
+    logger.info(
+        "Worker warmed up in %.2fs: %d stores, %d items cached",
+        time.perf_counter() - started, len(store_registry.all()), primed
+    )
@@ -5,7 +5,8 @@ from .zoho_webhooks_handlers import (
     PurchaseOrdersHandfler,
     SalesOrdersHandler,
     TransferOrdersHandler,
-    WebhookHandlerProtocol
+    WebhookHandlerProtocol,
+    drain_stock_coalescer
 )
 
 
@@ -15,5 +16,6 @@ __all__ = [
     "SalesOrdersHandler",
     "TransferOrdersHandler",
     "WebhookHandlerProtocol",
-    "handle_ecwid_webhook"
+    "handle_ecwid_webhook",
+    "drain_stock_coalescer"
 ]
\ No newline at end of file
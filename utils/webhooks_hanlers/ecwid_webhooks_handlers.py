@@ -1,13 +1,20 @@
-from abc import ABC
-import os
-from typing import Any, Dict
+import asyncio
+import time
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
 
 from ecwid_api import EcwidApi
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from zoho_api import ZohoApi
 
+from core import release_connection, settings
 from crud import ItemsCRUD, OrdersCRUD
+from models import ORDER_CONFIRMED, ORDER_CREATED, ORDER_PENDING, ORDER_SKIPPED, Orders, Stores
+from ..contacts import get_contact_resolver
+from ..tracing import traced
 
 import logging
 
@@ -16,6 +23,57 @@ PAID_STATUS = 'PAID'
 REFUND_STATUS = 'REFUNDED'
 
 
+class OrderNotSyncedError(Exception):
+    """The order.created job for this order hasn't created its Zoho sales order yet; the job is retried."""
+
+    def __init__(self, order_id: Any):
+        super().__init__(f"Order with ecwid_id {order_id} not synced yet")
+
+
+def _sales_order_not_created(exc: BaseException) -> bool:
+    """Whether a failed create_sales_order provably created nothing in Zoho."""
+    if isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code < 500
+
+
+async def _skip_order(db: AsyncSession, store: Stores, order_id: str, reason: str) -> None:
+    """Record an order that is deliberately not synced, so its updates aren't retried."""
+    await OrdersCRUD.claim(db, store.id, order_id, status=ORDER_SKIPPED)
+    logging.info("Ecwid order %s not synced: %s", order_id, reason)
+
+
+async def _find_synced_order(
+    db: AsyncSession,
+    order_id: Any,
+    ecwid_api: EcwidApi
+) -> Optional[Orders]:
+    """The order's row if it has a Zoho sales order; None if the event should be ignored.
+
+    Raises OrderNotSyncedError while the order.created job may still create
+    it. Orders that never get one (skipped, older than this service, lost)
+    stop being retried once they are older than ECWID_ORDER_SYNC_WINDOW.
+    """
+    order = await traced('find_order', OrdersCRUD.find_one_or_none(db, ecwid_order_id=order_id))
+    await release_connection(db)
+    if order and order.status == ORDER_SKIPPED:
+        return None
+    if order and order.status != ORDER_PENDING:
+        return order
+
+    order_data = await traced('get_order', ecwid_api.orders_client.get_order(order_id, responseFields='createTimestamp'))
+    age = time.time() - (order_data.get('createTimestamp') or 0)
+    if age < settings.ecwid_settings.ecwid_order_sync_window:
+        raise OrderNotSyncedError(order_id)
+    logging.warning("Ecwid order %s has no zoho sales order %.0fs after it was created; ignoring the event", order_id, age)
+    return None
+
+
+async def _confirm_sales_order(db: AsyncSession, zoho_api: ZohoApi, order: Orders) -> None:
+    await traced('confirm_sales_order', zoho_api.sales_orders_client.confirm_sales_order(order.zoho_order_id))
+    await OrdersCRUD.set_status(db, order, ORDER_CONFIRMED)
+
+
 def prepare_ecwid_data_for_zoho_contract(data: Dict[str, Any]) -> Dict[str, Any]:
     shipping_person = data.get('shippingPerson')
     billing_person = data.get('billingPerson')
@@ -43,147 +101,183 @@ def prepare_ecwid_data_for_zoho_contract(data: Dict[str, Any]) -> Dict[str, Any]
         
     }
 
+async def _map_order_items(
+    db: AsyncSession,
+    order_items: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    db_items = await ItemsCRUD.find_many_by_ecwid_item_ids(
+        db,
+        (item.get('productId') for item in order_items)
+    )
+
+    line_items, unmapped = [], []
+    for item in order_items:
+        product_id = item.get('productId')
+        db_item = db_items.get(product_id)
+        if not db_item:
+            unmapped.append(str(product_id))
+            continue
+
+        line_items.append({
+            'item_id': db_item.zoho_item_id,
+            'rate': item.get('price'),
+            'quantity': item.get('quantity')
+        })
+
+    return line_items, unmapped
+
+
 async def handle_create_order_webhook(
     db: AsyncSession,
+    store: Stores,
     event_data: Dict[str, str],
     ecwid_api: EcwidApi,
     zoho_api: ZohoApi
 ) -> None:
-    try:
-        
-        payment_status = event_data.get('newPaymentStatus')
-        order_id = event_data.get('orderId')
-        
-        if not order_id:
-            return
+    payment_status = event_data.get('newPaymentStatus')
+    order_id = event_data.get('orderId')
 
-        # Получаем данные заказа
-        response_fields = 'email,items,shippingPerson,billingPerson'
-        order_data = await ecwid_api.orders_client.get_order(order_id, responseFields=response_fields)
-        
-        customer_email = order_data.get('email')
-        if not customer_email:
-            return
+    if not order_id:
+        return
 
-        
-        # Работа с контактом в Zoho
-        try:
-            customers = (await zoho_api.contacts_client.list_contacts(email=customer_email)).get('contacts', [])
-            
-            if customers:
-                logging.info(customers)
-                customer_id = customers[0]['contact_id']
-            else:
-                contact_payload = prepare_ecwid_data_for_zoho_contract(order_data)
-                customer = await zoho_api.contacts_client.create_contact(**contact_payload)
-                customer_id = customer['contact']['contact_id']
-                
-        except Exception as e:
-            raise
-
-        # Формируем заказ в Zoho
-        zoho_payload = {
-            'customer_id': customer_id,
-            'line_items': [],
-            'notes': 'Sales order from Ecwid'
-        }
+    # Повтор задачи после create_sales_order не должен создать второй заказ в Zoho
+    existing = await traced('find_order', OrdersCRUD.find_one_or_none(db, ecwid_order_id=order_id))
+    await release_connection(db)
+    if existing and existing.status == ORDER_PENDING:
+        # Либо заказ сейчас создает другая доставка, либо попытка прервалась, не узнав ответа Zoho
+        logging.warning(
+            "Ecwid order %s: zoho sales order is being created by another attempt or its outcome is unknown; "
+            "not creating it again", order_id
+        )
+        return
+    if existing:
+        # Заказ создан, но подтверждение могло не пройти
+        if existing.status == ORDER_CREATED and payment_status == PAID_STATUS:
+            await _confirm_sales_order(db, zoho_api, existing)
+        logging.info("Ecwid order %s already synced as zoho sales order %s", order_id, existing.zoho_order_id)
+        return
 
-        
-        items_processed = 0
-        for item in order_data.get('items', []):
-            product_id = item.get('productId')
-            try:
-                db_item = await ItemsCRUD.find_one_or_none(db, ecwid_item_id=product_id)
-                if not db_item:
-                    continue
-                    
-                zoho_payload['line_items'].append({
-                    'item_id': db_item.zoho_item_id,
-                    'rate': item.get('price'),
-                    'quantity': item.get('quantity')
-                })
-                items_processed += 1
-                
-            except Exception as e:
-                raise
-
-        if not zoho_payload['line_items']:
-            return
+    # Получаем данные заказа
+    response_fields = 'email,items,shippingPerson,billingPerson'
+    order_data = await traced(
+        'get_order',
+        ecwid_api.orders_client.get_order(order_id, responseFields=response_fields)
+    )
 
-        
-        # Создаем заказ в Zoho
-        try:
-            response = await zoho_api.sales_orders_client.create_sales_order(**zoho_payload)
-            
-            zoho_order_id = str(response.get("salesorder", {}).get('salesorder_id'))
-            if not zoho_order_id:
-                return
-                
-            
-            # Сохраняем в базу данных
-            try:
-                await OrdersCRUD.create_entity(
-                    db, 
-                    store_id=1,
-                    zoho_order_id=zoho_order_id,
-                    ecwid_order_id=order_id
-                )
-            except Exception as e:
-                raise
-                
-            # Подтверждаем оплаченный заказ
-            if payment_status == PAID_STATUS:
-                await zoho_api.sales_orders_client.confirm_sales_order(zoho_order_id)
-
-                
-        except Exception as e:
-            raise
-            
-        
+    customer_email = order_data.get('email')
+    if not customer_email:
+        await _skip_order(db, store, order_id, "no customer email")
+        return
+
+    # Контакт в Zoho и сопоставление товаров независимы и выполняются параллельно.
+    # Резолвер контактов открывает свою сессию, поэтому db используется только для товаров.
+    customer_id, (line_items, unmapped) = await asyncio.gather(
+        traced('resolve_contact', get_contact_resolver().resolve(
+            zoho_api,
+            store.id,
+            customer_email,
+            lambda: prepare_ecwid_data_for_zoho_contract(order_data)
+        )),
+        traced('map_items', _map_order_items(db, order_data.get('items', [])))
+    )
+    # Не держим соединение, пока ждем Zoho; save_order возьмет новое
+    await release_connection(db)
+
+    if unmapped:
+        logging.warning(
+            "Ecwid order %s: no zoho mapping for products %s",
+            order_id, ", ".join(unmapped)
+        )
+
+    if not line_items:
+        await _skip_order(db, store, order_id, "no mapped products")
+        return
+
+    # Занимаем заказ до вызова Zoho: параллельная доставка того же события не создаст второй
+    order = await traced('claim_order', OrdersCRUD.claim(db, store.id, order_id))
+    await release_connection(db)
+    if order is None:
+        logging.info("Ecwid order %s is already being synced by another attempt", order_id)
+        return
+
+    # Создаем заказ в Zoho
+    zoho_payload = {
+        'customer_id': customer_id,
+        'line_items': line_items,
+        'notes': 'Sales order from Ecwid'
+    }
+    try:
+        response = await traced(
+            'create_sales_order',
+            zoho_api.sales_orders_client.create_sales_order(**zoho_payload)
+        )
     except Exception as e:
+        # Освобождаем заказ для повтора, только если Zoho его точно не создал
+        if _sales_order_not_created(e):
+            await OrdersCRUD.release(db, order)
         raise
 
+    zoho_order_id = response.get("salesorder", {}).get('salesorder_id')
+    if not zoho_order_id:
+        await OrdersCRUD.release(db, order)
+        return
+    zoho_order_id = str(zoho_order_id)
+
+    # Сохраняем до подтверждения: повтор задачи увидит статус и только подтвердит заказ
+    await traced('save_order', OrdersCRUD.set_status(db, order, ORDER_CREATED, zoho_order_id=zoho_order_id))
+
+    # Подтверждаем оплаченный заказ
+    if payment_status == PAID_STATUS:
+        await _confirm_sales_order(db, zoho_api, order)
+
+    logging.info("Ecwid order %s -> zoho sales order %s", order_id, zoho_order_id)
+
 
 async def handle_update_order_webhook(
     db: AsyncSession,
     event_data: Dict[str, str],
+    ecwid_api: EcwidApi,
     zoho_api: ZohoApi
 ) -> None:
     order_id = event_data.get("orderId")
-    order = await OrdersCRUD.find_one_or_none(db, ecwid_order_id=order_id)
+    order = await _find_synced_order(db, order_id, ecwid_api)
+    if not order:
+        return
     old_payment_status = event_data.get("oldPaymentStatus")
     new_payment_status = event_data.get("newPaymentStatus")
 
     if old_payment_status == UNPAID_STATUS and new_payment_status == PAID_STATUS:
-        await zoho_api.sales_orders_client.confirm_sales_order(order.zoho_order_id)
+        await _confirm_sales_order(db, zoho_api, order)
     elif old_payment_status != REFUND_STATUS and new_payment_status == REFUND_STATUS:
-        await zoho_api.sales_orders_client.delete_sales_order(order.zoho_order_id)
+        await traced('delete_sales_order', zoho_api.sales_orders_client.delete_sales_order(order.zoho_order_id))
 
 
 async def handle_delete_order_webhook(
     db: AsyncSession,
     event_data: Dict[str, str],
+    ecwid_api: EcwidApi,
     zoho_api: ZohoApi
 ) -> None:
     order_id = event_data.get('orderId')
-    order = await OrdersCRUD.find_one_or_none(db, ecwid_order_id=order_id)
+    order = await _find_synced_order(db, order_id, ecwid_api)
     if not order:
-        raise HTTPException(status_code=404, detail=f"Order with ecwid_id {order_id} not found")
-    await zoho_api.sales_orders_client.delete_sales_order(order.zoho_order_id)
+        return
+    await traced('delete_sales_order', zoho_api.sales_orders_client.delete_sales_order(order.zoho_order_id))
 
 async def handle_ecwid_webhook(
     db: AsyncSession,
+    store: Stores,
     event_type: str,
     event_data: Dict[str, str],
     ecwid_api: EcwidApi,
     zoho_api: ZohoApi
 ) -> None:
     if event_type == 'order.created':
-        await handle_create_order_webhook(db, event_data, ecwid_api, zoho_api)
+        await handle_create_order_webhook(db, store, event_data, ecwid_api, zoho_api)
     elif event_type == 'order.updated':
-        await handle_update_order_webhook(db, event_data, zoho_api)
+        await handle_update_order_webhook(db, event_data, ecwid_api, zoho_api)
     elif event_type == 'order.deleted':
-        await handle_delete_order_webhook(db, event_data, zoho_api)
+        await handle_delete_order_webhook(db, event_data, ecwid_api, zoho_api)
     else:
         raise HTTPException(status_code=400, detail="Unknown event type")
 
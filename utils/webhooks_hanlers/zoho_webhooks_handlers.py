@@ -1,5 +1,9 @@
+import asyncio
+import logging
 
-from typing import Any, Dict, List, Protocol
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+
+import httpx
 
 from fastapi import (
     HTTPException, 
@@ -7,24 +11,44 @@ from fastapi import (
 from ecwid_api import EcwidApi
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from core import settings
-from crud import (
-    ItemsCRUD,
-    StoresCRUD,
-    WebhookCRUD,
-    WebhookItemCRUD
-)
-from models import (
-    Items, 
-    Stores
-)
+from core import release_connection, settings
+from crud import ItemsCRUD
+from models import Stores
+from ..audit import get_audit_sink
+from ..coalescer import StockDeltaCoalescer
+from ..jobs import get_job_progress, save_job_progress
+from ..tracing import span, traced
+
+logger = logging.getLogger(__name__)
+
+_store_semaphores: Dict[int, asyncio.Semaphore] = {}
+
+
+def get_store_semaphore(store_id: int) -> asyncio.Semaphore:
+    semaphore = _store_semaphores.get(store_id)
+    if semaphore is None:
+        semaphore = _store_semaphores[store_id] = asyncio.Semaphore(
+            settings.ecwid_settings.ecwid_stock_concurrency
+        )
+    return semaphore
 
-TARGET_WH_ID = settings.zoho_settings.zoho_warehouse_id
-AMAZON_CUSTOMER_ID = settings.zoho_settings.amazon_customer_id
+
+def _is_retryable(exc: Exception) -> bool:
+    """Whether the stock PUT provably wasn't applied, so sending it again can't double it.
+
+    quantityDelta isn't idempotent: after a read timeout, a broken response
+    or a 5xx the change may already be in Ecwid, so those fail and are left
+    to the reconciliation. A 429 reaching this far has already been retried
+    by the pooled client up to RATE_LIMIT_MAX_RETRIES times.
+    """
+    return isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
 
 #TODO: Добавить отправку уведомлений в тг о несуществующем магазине или товаре
 
 class WebhookHandlerProtocol(Protocol):
+    @staticmethod
+    def get_event_id(payload: dict) -> Optional[str]: ...
+
     @staticmethod
     async def _get_items_data_from_request(payload: dict) -> List[Dict[str, Any]]: ...
 
@@ -35,83 +59,241 @@ class WebhookHandlerProtocol(Protocol):
     async def update_ecwid_stock_from_webhook(
         cls,
         data: dict,
-        store_id: str,
+        store: Stores,
         ecwid_api: EcwidApi,
         db: AsyncSession,
         webhook_type: str
-    ) -> Dict[str, dict]: ...
+    ) -> Dict[str, list]: ...
 
 class BaseHandler:
     @staticmethod
-    async def _find_store_entity_in_database(
-        db: AsyncSession,
-        **data: Any
-    ) -> Stores:
-        store = await StoresCRUD.find_one_or_none(db, **data)
-        if not store:
-            raise HTTPException(status_code=404, detail="Store not found")
-        
-        return store
-    
+    async def _adjust_ecwid_stock(
+        ecwid_api: EcwidApi,
+        store_id: int,
+        ecwid_item_id: int,
+        quantity: int
+    ) -> Dict[str, Any]:
+        ecwid_settings = settings.ecwid_settings
+        semaphore = get_store_semaphore(store_id)
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                async with semaphore:
+                    await ecwid_api.products_client.adjust_product_stock(ecwid_item_id, quantity)
+                return {"status": "success", "attempts": attempts}
+            except Exception as e:
+                if attempts > ecwid_settings.ecwid_stock_retries or not _is_retryable(e):
+                    return {"status": "failed", "attempts": attempts, "error": repr(e)}
+            await asyncio.sleep(ecwid_settings.ecwid_retry_backoff * 2 ** (attempts - 1))
+
     @classmethod
-    async def _find_item_entity_in_database(
+    async def _adjust_ecwid_stock_batch(
         cls,
-        store: Stores,
-        db: AsyncSession,
-        **kwargs: Any
-    ) -> Items:
-        data = {"store_id": store.id}
-        data.update(kwargs)
-
-        item = await ItemsCRUD.find_one_or_none(db, **data)
-        if not item:
-            raise HTTPException(status_code=404, detail="Item not found")
-        
-        return item
-    
+        ecwid_api: EcwidApi,
+        store_id: int,
+        adjustments: List[Tuple[int, int]]
+    ) -> List[Dict[str, Any]]:
+        """Apply (ecwid_item_id, quantity) adjustments through Ecwid's batch API.
+
+        Sub-request ids are the adjustment's index, so every result maps back
+        to its line item. Sub-requests rejected with 429 or not executed, and
+        whole batches Ecwid refused with a 4xx, fall back to single requests.
+        A 5xx or a lost response doesn't prove nothing was applied, so those
+        are recorded as failed rather than sent again.
+        """
+        ecwid_settings = settings.ecwid_settings
+        outcomes: List[Optional[Dict[str, Any]]] = [None] * len(adjustments)
+        fallback: List[int] = []
+
+        async def run_batch(start: int) -> None:
+            indexes = range(start, min(start + ecwid_settings.ecwid_batch_size, len(adjustments)))
+            requests = [
+                ecwid_api.products_client.adjust_product_stock_request(str(index), *adjustments[index])
+                for index in indexes
+            ]
+            try:
+                async with get_store_semaphore(store_id):
+                    ticket = await ecwid_api.batch_client.submit(requests)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code < 500:
+                    fallback.extend(indexes)
+                    return
+                for index in indexes:
+                    outcomes[index] = {"status": "failed", "attempts": 1, "error": repr(e)}
+                return
+            except Exception as e:
+                for index in indexes:
+                    outcomes[index] = {"status": "failed", "attempts": 1, "error": repr(e)}
+                return
+
+            try:
+                results = await ecwid_api.batch_client.wait_for_result(
+                    ticket, ecwid_settings.ecwid_batch_poll_interval, ecwid_settings.ecwid_batch_timeout
+                )
+            except Exception as e:
+                for index in indexes:
+                    outcomes[index] = {"status": "failed", "attempts": 1, "error": repr(e), "batch_ticket": ticket}
+                return
+
+            for index in indexes:
+                result = results.get(str(index), {})
+                status_code = result.get('httpStatusCode') or 0
+                if result.get('status') == "COMPLETED" and status_code < 400:
+                    outcomes[index] = {"status": "success", "attempts": 1, "batch_ticket": ticket}
+                elif result.get('status') == "FAILED" and status_code != 429:
+                    outcomes[index] = {
+                        "status": "failed",
+                        "attempts": 1,
+                        "error": f"HTTP {status_code}: {result.get('escapedHttpBody')}",
+                        "batch_ticket": ticket
+                    }
+                else:
+                    fallback.append(index)
+
+        await asyncio.gather(*(run_batch(start) for start in range(0, len(adjustments), ecwid_settings.ecwid_batch_size)))
+
+        if fallback:
+            retried = await asyncio.gather(*(
+                cls._adjust_ecwid_stock(ecwid_api, store_id, *adjustments[index])
+                for index in fallback
+            ))
+            for index, outcome in zip(fallback, retried):
+                outcomes[index] = outcome
+
+        return outcomes
+
     @classmethod
     async def update_ecwid_stock_from_webhook(
         cls: type[WebhookHandlerProtocol],
         payload: dict,
-        zoho_organization_id: str,
+        store: Stores,
         ecwid_api: EcwidApi,
         db: AsyncSession,
         webhook_type: str
-    ) -> Dict[str, dict]:
-        store = await cls._find_store_entity_in_database(db, zoho_organization_id=zoho_organization_id)
+    ) -> Dict[str, list]:
         items_data = await cls._get_items_data_from_request(payload)
-        webhook = await WebhookCRUD.create_entity(
-            db,
-            type=webhook_type
-        )
+
+        target_warehouse_id = settings.zoho_settings.zoho_warehouse_id
+        line_items = []
         for item in items_data:
             warehouse_id = item.get('warehouse_id', None)
-            if warehouse_id and warehouse_id != TARGET_WH_ID:
+            if warehouse_id and warehouse_id != target_warehouse_id:
                 continue
-            
-            zoho_item_id = str(item.get('item_id'))
+            line_items.append(item)
 
-            db_item = await cls._find_item_entity_in_database(
-                store=store,
-                db=db,
-                zoho_item_id=zoho_item_id
-            )
+        db_items = await traced('find_items', ItemsCRUD.find_many_by_zoho_item_ids(
+            db,
+            store.id,
+            (str(item.get('item_id')) for item in line_items)
+        ), count=len(line_items))
+        # Дальше только запросы к Ecwid, соединение с БД больше не нужно
+        await release_connection(db)
 
+        # quantityDelta не идемпотентен: позиции, отправленные прошлыми попытками задания, не повторяем
+        progress = get_job_progress()
+        sent = set(progress.get("sent_lines", []))
+
+        mapped, unmapped, resent = [], [], []
+        for index, item in enumerate(line_items):
+            zoho_item_id = str(item.get('item_id'))
+            db_item = db_items.get(zoho_item_id)
             if not db_item:
+                unmapped.append(zoho_item_id)
                 continue
+            if index in sent:
+                resent.append(zoho_item_id)
+                continue
+            mapped.append((index, zoho_item_id, db_item, cls._get_quantity_change_from_item(item)))
+
+        if resent:
+            logger.warning(
+                "%s webhook: skipping zoho items %s, sent to ecwid by an earlier attempt",
+                webhook_type, ", ".join(resent)
+            )
+        if mapped:
+            # Сохраняем до отправки: после сбоя позиция скорее потеряется (её поправит сверка), чем применится дважды
+            progress["sent_lines"] = sorted(sent | {index for index, *_ in mapped})
+            await save_job_progress(progress)
+
+        batch_threshold = settings.ecwid_settings.ecwid_batch_threshold
+        if batch_threshold and len(mapped) > batch_threshold:
+            outcomes = await traced('adjust_stock_batch', cls._adjust_ecwid_stock_batch(
+                ecwid_api,
+                store.id,
+                [(db_item.ecwid_item_id, quantity) for _, _, db_item, quantity in mapped]
+            ), count=len(mapped))
+        else:
+            stock_coalescer = get_stock_coalescer()
+            adjust = stock_coalescer.submit if stock_coalescer else cls._adjust_ecwid_stock
+            with span('adjust_stock', count=len(mapped)):
+                outcomes = await asyncio.gather(*(
+                    traced(
+                        'adjust_item',
+                        adjust(ecwid_api, store.id, db_item.ecwid_item_id, quantity),
+                        ecwid_item_id=db_item.ecwid_item_id
+                    )
+                    for _, _, db_item, quantity in mapped
+                ))
 
-            ecwid_item_id = db_item.ecwid_item_id
-            quantity = cls._get_quantity_change_from_item(item)
+        results, audit_items = [], []
+        for (_, zoho_item_id, db_item, quantity), outcome in zip(mapped, outcomes):
+            results.append({
+                "zoho_item_id": zoho_item_id,
+                "ecwid_item_id": db_item.ecwid_item_id,
+                "quantity": quantity,
+                **outcome
+            })
+            if outcome["status"] == "success":
+                audit_items.append({"item_id": db_item.id, "quantity": quantity})
+
+        webhook_id = None
+        # Повтор после уже отправленных позиций ничего не изменил, писать его в аудит незачем
+        if mapped or not sent:
+            try:
+                # Only queued here; the audit sink writes it in the background
+                webhook_id = await get_audit_sink().log_webhook(webhook_type, audit_items)
+            except Exception:
+                # Stock changes are already sent: failing the job now would only make its retry skip them
+                logger.exception("%s webhook: failed to record the audit entry for %s", webhook_type, audit_items)
+
+        failed = [result for result in results if result["status"] != "success"]
+        if failed:
+            logger.error(
+                "%s webhook %s: %d of %d ecwid stock adjustments failed: %s",
+                webhook_type, webhook_id, len(failed), len(results), failed
+            )
 
-            await ecwid_api.products_client.adjust_product_stock(ecwid_item_id, quantity)
-            await WebhookItemCRUD.create_entity(
-                db,
-                webhook_id=webhook.id,
-                item_id=db_item.id,
-                quantity=quantity
+        if unmapped:
+            logger.warning(
+                "%s webhook %s: no ecwid mapping for zoho items %s",
+                webhook_type, webhook_id, ", ".join(unmapped)
             )
 
+        return {"results": results, "unmapped": unmapped}
+
+_stock_coalescer: Optional[StockDeltaCoalescer] = None
+
+
+def get_stock_coalescer() -> Optional[StockDeltaCoalescer]:
+    """The process-wide coalescer, built on first use; None when coalescing is disabled."""
+    global _stock_coalescer
+    window = settings.ecwid_settings.ecwid_coalesce_window_ms / 1000
+    if _stock_coalescer is None and window:
+        _stock_coalescer = StockDeltaCoalescer(window, BaseHandler._adjust_ecwid_stock)
+    return _stock_coalescer
+
+
+async def drain_stock_coalescer() -> None:
+    if _stock_coalescer is not None:
+        await _stock_coalescer.drain()
+
+
 class InventoryAdjustmentHandler(BaseHandler):
+    @staticmethod
+    def get_event_id(payload: dict) -> Optional[str]:
+        return payload.get('inventory_adjustment', {}).get('inventory_adjustment_id')
+
     @staticmethod
     async def _get_items_data_from_request(payload: dict) -> List[Dict[str, Any]]:
 
@@ -128,10 +310,14 @@ class InventoryAdjustmentHandler(BaseHandler):
     ) -> int: return item.get('quantity_adjusted')
 
 class SalesOrdersHandler(BaseHandler):
+    @staticmethod
+    def get_event_id(payload: dict) -> Optional[str]:
+        return payload.get('salesorder', {}).get('salesorder_id')
+
     @staticmethod
     async def _get_items_data_from_request(payload: dict) -> List[Dict[str, Any]]:
         data = payload.get('salesorder', {})
-        if data.get('customer_id', '') != AMAZON_CUSTOMER_ID:
+        if data.get('customer_id', '') != settings.zoho_settings.amazon_customer_id:
             raise HTTPException(status_code=400, detail="Unsupported customer")
         return data.get('line_items', [])
     
@@ -142,6 +328,10 @@ class SalesOrdersHandler(BaseHandler):
 
 
 class PurchaseOrdersHandfler(BaseHandler):
+    @staticmethod
+    def get_event_id(payload: dict) -> Optional[str]:
+        return payload.get('purchaseorder', {}).get('purchaseorder_id')
+
     @staticmethod
     async def _get_items_data_from_request(payload: dict) -> List[Dict[str, Any]]:
         data = payload.get('purchaseorder', {})
@@ -153,6 +343,10 @@ class PurchaseOrdersHandfler(BaseHandler):
     ) -> int: return item.get('quantity')
 
 class TransferOrdersHandler(BaseHandler):
+    @staticmethod
+    def get_event_id(payload: dict) -> Optional[str]:
+        return payload.get('transfer_order', {}).get('transfer_order_id')
+
     @staticmethod
     async def _get_items_data_from_request(payload: dict) -> List[Dict[str, Any]]:
         data = payload.get('transfer_order', {})